@@ -17,13 +17,13 @@
 
 from git_upstream.errors import GitUpstreamError
 from git_upstream.log import LogDedentMixin
+from git_upstream.lib.note import NotesMap
 from git_upstream.lib.utils import GitMixin
 from git_upstream import subcommand, log
 
 from git import BadObject
 
 import inspect
-import re
 
 
 class DropError(GitUpstreamError):
@@ -65,8 +65,12 @@ class Drop(LogDedentMixin, GitMixin):
                 "Commit '%s' not found (or ambiguous)" % git_object)
 
         if not author:
-            self._author = '%s <%s>' % (self.repo.git.config('user.name'),
-                                        self.repo.git.config('user.email'))
+            name = self.config.get('user.name')
+            email = self.config.get('user.email')
+            if not name or not email:
+                raise DropError("Author should be provided when git "
+                                "'user.name' and 'user.email' are not set")
+            self._author = '%s <%s>' % (name, email)
         else:
             self._author = author
 
@@ -90,15 +94,12 @@ class Drop(LogDedentMixin, GitMixin):
 
     def check_duplicates(self):
         """Check if a dropped header is already present"""
-        note = self.commit.note(note_ref=Drop.NOTE_REF)
-        if note:
-            pattern = '^%s\s*(.+)' % Drop.DROP_HEADER
-            m = re.search(pattern, note, re.MULTILINE | re.IGNORECASE)
-            if m:
-                self.log.warning(
-                    """Drop header already present in the note for commit '%s':
-                       %s""" % (self.commit, m.group(1)))
-                return False
+        note = NotesMap(Drop.NOTE_REF, repo=self.repo).get(self.commit.hexsha)
+        if note and note.dropped:
+            self.log.warning(
+                """Drop header already present in the note for commit '%s':
+                   %s""" % (self.commit, note.dropped[0]))
+            return False
         return True
 
     def mark(self):
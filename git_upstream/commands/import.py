@@ -17,16 +17,28 @@
 
 from git_upstream.errors import GitUpstreamError
 from git_upstream.log import LogDedentMixin
+from git_upstream.lib.catfile import ObjectReader
 from git_upstream.lib.utils import GitMixin
 from git_upstream.lib.rebaseeditor import RebaseEditor
+from git_upstream.lib.record import ImportRecord
+from git_upstream.lib.runner import GitRunner
 from git_upstream import subcommand, log
 from git_upstream.lib.searchers import UpstreamMergeBaseSearcher
 
 from abc import ABCMeta, abstractmethod
 from collections import Sequence
+from multiprocessing import cpu_count
+from operator import attrgetter
 from git import GitCommandError
 
 import inspect
+import itertools
+import json
+import sys
+
+# exit status when the upstream and additional branches have already been
+# imported, distinct from the status of 1 used for errors
+NOTHING_TO_IMPORT = 3
 
 
 class ImportUpstreamError(GitUpstreamError):
@@ -49,6 +61,7 @@ class ImportUpstream(LogDedentMixin, GitMixin):
         self._upstream = upstream
         self._import_branch = import_branch
         self._extra_branches = extra_branches
+        self._import_point = None
 
         # make sure to correctly initialise inherited objects before performing
         # any computation
@@ -73,8 +86,7 @@ class ImportUpstream(LogDedentMixin, GitMixin):
 
         invalid_ref = False
         for branch in branches:
-            if not any(head for head in self.repo.heads
-                       if head.name == branch):
+            if "refs/heads/" + branch not in self.refs:
                 msg = "Specified ref does not exist: '%s'"
                 self.log.error(msg, branch)
                 invalid_ref = True
@@ -108,6 +120,16 @@ class ImportUpstream(LogDedentMixin, GitMixin):
         """
         return self._extra_branches
 
+    def is_up_to_date(self):
+        """
+        Check whether the upstream branch and each of the additional branches
+        are already merged into the target branch, in which case importing
+        would not change anything.
+        """
+        branches = [self.upstream] + list(self.extra_branches)
+        merged = self.valid_commits(branches, refs=[self.branch])
+        return all(merged.values())
+
     def _set_branch(self, branch, commit, checkout=False, force=False):
 
         if str(self.repo.active_branch) == branch:
@@ -153,13 +175,10 @@ class ImportUpstream(LogDedentMixin, GitMixin):
         if not commit:
             commit = self.upstream
 
-        try:
-            self.git.show_ref(commit, quiet=True, heads=True)
-
-        except GitCommandError as e:
+        if not self.refs.show(commit, heads=True):
             msg = "Invalid commit '%s' specified to import from"
             self.log.error(msg, commit)
-            raise ImportUpstreamError((msg + ": %s"), commit, e)
+            raise ImportUpstreamError(msg % commit)
 
         if not import_branch:
             import_branch = self.import_branch
@@ -182,8 +201,9 @@ class ImportUpstream(LogDedentMixin, GitMixin):
                     """, describe_commit, commit)
         describe_branches = [describe_commit]
 
-        describe_branches.extend([self.git.rev_parse(b, short=True)
-                                  for b in self.extra_branches])
+        describe_branches.extend(
+            GitRunner(repo=self.repo).map(
+                'rev_parse', [(b,) for b in self.extra_branches], short=True))
         import_describe = "-".join(describe_branches)
         self._import_branch = self.import_branch.format(
             describe=import_describe)
@@ -198,13 +218,13 @@ class ImportUpstream(LogDedentMixin, GitMixin):
             Checking if import branch '%s' already exists:
                 git branch --list %s
             """, base, base)
-        if self.git.show_ref("refs/heads/" + base, verify=True,
-                             with_exceptions=False) and not force:
+        if "refs/heads/" + base in self.refs and not force:
             msg = "Import branch '%s' already exists, set 'force' to replace"
             self.log.error(msg, self.import_branch)
             raise ImportUpstreamError(msg % self.import_branch)
 
         self._set_branch(base, commit, checkout, force)
+        self._import_point = self.git.rev_parse(commit + "^{commit}")
 
         if self.extra_branches:
             self.log.info(
@@ -219,34 +239,37 @@ class ImportUpstream(LogDedentMixin, GitMixin):
 
     def _linearise(self, branch, sequence, previous_import):
 
-        counter = len(sequence) - 1
+        # the sequence lists commits oldest first
+        last = len(sequence) - 1
+        counter = 0
         ancestors = set()
 
         self._set_branch(branch, previous_import, checkout=True, force=True)
-        root = previous_import.hexsha
-        while counter > 0:
-            # add commit to list of ancestors to check
-            ancestors.add(root)
+        root = previous_import
+        while counter < last:
+            # add commit to list of ancestors to check, using the binary SHA1
+            # objects already held by the commits to avoid new allocations
+            ancestors.add(root.binsha)
 
             # look for merge commits that are not part of ancestry path
-            for idx in xrange(counter - 1, -1, -1):
+            for idx in xrange(counter + 1, last + 1):
                 commit = sequence[idx]
                 # if there is only one parent, no need to check the others
-                if len(commit.parents) < 2:
-                    ancestors.add(commit.hexsha)
-                elif any(p.hexsha not in ancestors for p in commit.parents):
+                if len(commit.parent_ids) < 2:
+                    ancestors.add(commit.binsha)
+                elif any(p not in ancestors for p in commit.parent_binshas):
                     self.log.debug("Rebase upto commit SHA1: %s",
                                    commit.hexsha)
-                    idx = idx + 1
+                    idx = idx - 1
                     break
                 else:
-                    ancestors.add(commit.hexsha)
+                    ancestors.add(commit.binsha)
             tip = sequence[idx].hexsha
 
-            self.log.info("Rebasing from %s to %s", root, tip)
+            self.log.info("Rebasing from %s to %s", root.hexsha, tip)
             previous = self.git.rev_parse(branch)
             self.log.info("Rebasing onto '%s'", previous)
-            if root == previous and idx == 0:
+            if root.hexsha == previous and idx == last:
                 # special case, we are already linear
                 self.log.info("Already in a linear layout")
                 return
@@ -256,28 +279,31 @@ class ImportUpstream(LogDedentMixin, GitMixin):
                     """\
                         git rebase -p --onto=%s \\
                             %s %s
-                    """, previous, root, branch)
-                self.git.rebase(root, branch, onto=previous, p=True)
+                    """, previous, root.hexsha, branch)
+                self.git.rebase(root.hexsha, branch, onto=previous, p=True)
             except:
                 self.git.rebase(abort=True, with_exceptions=False)
                 raise
-            counter = idx - 1
+            counter = idx + 1
             # set root commit for next loop
-            root = sequence[counter].hexsha
+            root = sequence[counter]
+
+    def _log_commits(self, commit_iter):
+        for commit in commit_iter:
+            self.log.debug("    %s", commit.hexsha, dedent=False)
+            yield commit
 
     def apply(self, strategy, interactive=False):
         """Apply list of commits given onto latest import of upstream"""
 
-        commit_list = list(strategy.filtered_iter())
-        if len(commit_list) == 0:
+        commit_iter = strategy.filtered_iter()
+        first = next(commit_iter, None)
+        if first is None:
             self.log.notice("There are no local changes to be applied!")
             return False
 
-        self.log.debug(
-            """\
-            Should apply the following list of commits
-                %s
-            """, "\n    ".join([c.hexsha for c in commit_list]))
+        self.log.debug("Should apply the following list of commits")
+        commit_list = self._log_commits(itertools.chain([first], commit_iter))
 
         base = self.import_branch + "-base"
 
@@ -318,17 +344,15 @@ class ImportUpstream(LogDedentMixin, GitMixin):
             self._set_branch(self.import_branch, self.branch, force=True)
 
         rebase = RebaseEditor(interactive, repo=self.repo)
-        if len(commit_list):
-            first = commit_list[0]
-
+        if first:
             self.log.info(
                 """\
                 Rebase changes, dropping merges through editor:
                     git rebase --onto %s \\
                         %s %s
-                """, base, first.parents[0].hexsha, self.import_branch)
+                """, base, first.parents[0], self.import_branch)
             status, out, err = rebase.run(commit_list,
-                                          first.parents[0].hexsha,
+                                          first.parents[0],
                                           self.import_branch,
                                           onto=base)
             if status:
@@ -366,7 +390,8 @@ class ImportUpstream(LogDedentMixin, GitMixin):
         """
         self.log.info("No verification checks enabled")
         self.git.checkout(self.branch)
-        current_sha = self.git.rev_parse("HEAD")
+        reader = ObjectReader.for_repo(self.repo)
+        current_sha = reader.resolve("HEAD")
 
         try:
             self.log.info(
@@ -400,10 +425,14 @@ class ImportUpstream(LogDedentMixin, GitMixin):
             self.git.checkout("--", ".")
             # finally test that everything worked correctly by comparing if
             # the tree object id's match
-            if self.git.rev_parse("HEAD^{tree}") != \
-                    self.git.rev_parse("%s^{tree}" % self.import_branch):
+            if reader.resolve("HEAD^{tree}") != \
+                    reader.resolve("%s^{tree}" % self.import_branch):
                 raise ImportUpstreamError(
                     "Resulting tree does not match import")
+            # allow the next import to start from this one without searching
+            if self._import_point:
+                ImportRecord(self.branch, repo=self.repo).write(
+                    self._import_point, self.upstream, self.extra_branches)
         except (GitCommandError, ImportUpstreamError):
             self.log.error(
                 """\
@@ -441,48 +470,184 @@ class ImportStrategiesFactory(object):
         return cls.__strategies.keys()
 
 
-from git_upstream.lib.searchers import (NoMergeCommitFilter,
-                                        ReverseCommitFilter,
+from git_upstream.lib.searchers import (StageStats,
+                                        StatsCommitFilter,
+                                        ParallelCommitFilter,
+                                        NoMergeCommitFilter,
                                         DiscardDuplicateGerritChangeId,
                                         SupersededCommitFilter,
                                         DroppedCommitFilter)
 
 
-class LocateChangesStrategy(GitMixin, Sequence):
+class LocateChangesStrategy(LogDedentMixin, GitMixin, Sequence):
     """
     Base class that needs to be extended with the specific strategy on how to
     handle changes locally that are not yet upstream.
+
+    Commits are listed oldest first and are read from the searcher as they
+    are consumed. With 'cache' enabled every commit read is retained so that
+    the strategy may be iterated again and indexed, otherwise it can only be
+    iterated over once and only commits read ahead by is_empty() or indexing
+    are held.
+
+    With 'explain' enabled, L{StageStats} are recorded for reading commits
+    from the searcher and for each filter applied by filtered_iter(), and
+    made available in order as the 'stats' list.
+
+    Filters able to evaluate commits concurrently are run using 'jobs'
+    threads, which defaults to the 'upstream.jobs' git config setting, or a
+    single thread if not set. Setting it to 0 uses one for each CPU. The
+    same number of merge-base commands may be used by the searcher.
     """
     __metaclass__ = ABCMeta
 
     @abstractmethod
-    def __init__(self, git=None, *args, **kwargs):
+    def __init__(self, git=None, cache=True, explain=False, jobs=None, *args,
+                 **kwargs):
         """
         Initialize an empty filters list
         """
-        self.data = None
+        self.data = []
         self.filters = []
+        self.cache = cache
+        self._jobs = jobs
+        self.stats = None
+        if explain:
+            search = StageStats("search")
+            search.commits_in = None
+            self.stats = [search]
+        self._commits = None
         super(LocateChangesStrategy, self).__init__(*args, **kwargs)
 
+    @property
+    def jobs(self):
+        """
+        Number of threads to evaluate parallel filters with.
+        """
+        if self._jobs is None:
+            try:
+                self._jobs = self.config.get_int("upstream.jobs", 1)
+            except ValueError:
+                raise ImportUpstreamError(
+                    "Invalid value for 'upstream.jobs': %s" %
+                    self.config.get("upstream.jobs"))
+        if self._jobs == 0:
+            self._jobs = cpu_count()
+        return max(self._jobs, 1)
+
+    def _next(self):
+        if self._commits is None:
+            self._commits = self._iterdata()
+        return next(self._commits, None)
+
+    def _read(self):
+        """
+        Read the next commit from the searcher, returning None once there
+        are no more.
+        """
+        if self.stats is None:
+            return self._next()
+
+        commit = self.stats[0].measure(self._next)
+        if commit is not None:
+            self.stats[0].commits_out += 1
+        return commit
+
+    def _fill(self):
+        self.data.extend(iter(self._read, None))
+
+    def __iter__(self):
+        if not self.cache:
+            while self.data:
+                yield self.data.pop(0)
+            for commit in iter(self._read, None):
+                yield commit
+            return
+
+        # replay the commits already read before continuing with the
+        # remainder from the searcher, which may happen while other
+        # iterators or lookups are also consuming it
+        idx = 0
+        while True:
+            if idx == len(self.data):
+                commit = self._read()
+                if commit is None:
+                    return
+                self.data.append(commit)
+            yield self.data[idx]
+            idx += 1
+
     def __getitem__(self, key):
-        if not self.data:
-            self.data = self._popdata()
+        if isinstance(key, int) and key >= 0:
+            # only read as far as the requested commit
+            while len(self.data) <= key:
+                commit = self._read()
+                if commit is None:
+                    break
+                self.data.append(commit)
+        else:
+            self._fill()
         return self.data[key]
 
     def __len__(self):
-        if not self.data:
-            self.data = self._popdata()
+        self._fill()
         return len(self.data)
 
+    def is_empty(self):
+        """
+        Check whether there are any commits, reading at most one from the
+        searcher.
+        """
+        if self.data:
+            return False
+        commit = self._read()
+        if commit is None:
+            return True
+        self.data.append(commit)
+        return False
+
     @classmethod
     def get_strategy_name(cls):
         return cls._strategy
 
+    def plan_filters(self):
+        """
+        Return the filters in the order they should be applied, running the
+        cheaper filters first so that fewer commits reach the expensive ones.
+
+        Only filters that commute are reordered, and never across one that
+        does not, keeping the order amongst filters of equal cost.
+        """
+        plan = []
+        segment = []
+        for f in self.filters:
+            if f.commutes:
+                segment.append(f)
+            else:
+                plan.extend(sorted(segment, key=attrgetter('cost')))
+                plan.append(f)
+                segment = []
+        plan.extend(sorted(segment, key=attrgetter('cost')))
+
+        self.log.debug(
+            """\
+            Filter plan:
+                %s
+            """, "\n    ".join(["%s (cost %d)" % (f.name, f.cost)
+                                for f in plan]))
+
+        return plan
+
     def filtered_iter(self):
         # chain the filters as generators so that we don't need to allocate new
         # lists for each step in the filter chain.
         commit_list = self
-        for f in self.filters:
+        for f in self.plan_filters():
+            if f.parallel and self.jobs > 1:
+                f = ParallelCommitFilter(f, self.jobs)
+            if self.stats is not None:
+                f = StatsCommitFilter(f)
+                self.stats.append(f.stats)
             commit_list = f.filter(commit_list)
 
         return commit_list
@@ -491,11 +656,11 @@ class LocateChangesStrategy(GitMixin, Sequence):
 
         return list(self.filtered_iter())
 
-    def _popdata(self):
+    def _iterdata(self):
         """
-        Should return the list of commits from the searcher object
+        Should return an iterator over the commits from the searcher object
         """
-        return self.searcher.list()
+        return self.searcher.iter_commits(reverse=True)
 
 
 class LocateChangesWalk(LocateChangesStrategy):
@@ -509,6 +674,7 @@ class LocateChangesWalk(LocateChangesStrategy):
                                                   pattern=search_ref)
         self.search_ref = search_ref
         super(LocateChangesWalk, self).__init__(*args, **kwargs)
+        self.searcher.jobs = self.jobs
 
     def filtered_iter(self):
         # may wish to make class used to remove duplicate objects configurable
@@ -518,7 +684,6 @@ class LocateChangesWalk(LocateChangesStrategy):
                 DiscardDuplicateGerritChangeId(self.search_ref,
                                                limit=self.searcher.commit))
         self.filters.append(NoMergeCommitFilter())
-        self.filters.append(ReverseCommitFilter())
         self.filters.append(DroppedCommitFilter())
         self.filters.append(
             SupersededCommitFilter(self.search_ref,
@@ -527,6 +692,32 @@ class LocateChangesWalk(LocateChangesStrategy):
         return super(LocateChangesWalk, self).filtered_iter()
 
 
+def explain(logger, stats, json_file=None):
+    """
+    Print a table of the statistics recorded for each stage of locating the
+    changes to apply, optionally also writing them as JSON to 'json_file'.
+    """
+    logger.notice("%-40s %8s %8s %10s %6s", "Stage", "In", "Out", "Time (s)",
+                  "Git")
+    for stage in stats:
+        logger.notice("%-40s %8s %8d %10.3f %6d", stage.name,
+                      "-" if stage.commits_in is None else stage.commits_in,
+                      stage.commits_out, stage.time, stage.git_commands)
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump([stage.as_dict() for stage in stats], f, indent=4,
+                      separators=(",", ": "), sort_keys=True)
+
+
+@subcommand.arg('--explain-json', dest='explain_json', metavar='<file>',
+                help='Write the statistics reported by --explain to <file> '
+                     'as JSON.')
+@subcommand.arg('--explain', dest='explain', action='store_true',
+                default=False,
+                help='Report the commits passed in and out, time taken and '
+                     'git commands run by each stage in locating the changes '
+                     'to apply.')
 @subcommand.arg('-d', '--dry-run', dest='dry_run', action='store_true',
                 default=False,
                 help='Only print out the list of commits that would be '
@@ -535,7 +726,9 @@ class LocateChangesWalk(LocateChangesStrategy):
                 help='Let the user edit the list of commits before applying.')
 @subcommand.arg('-f', '--force', dest='force', required=False,
                 action='store_true', default=False,
-                help='Force overwrite of existing import branch if it exists.')
+                help='Force overwrite of existing import branch if it exists, '
+                     'and import even if the upstream and additional '
+                     'branches are already merged into the target branch.')
 @subcommand.arg('--merge', dest='merge', required=False, action='store_true',
                 default=True,
                 help='Merge the resulting import branch into the target branch'
@@ -583,20 +776,29 @@ def do_import(args):
                                      import_branch=args.import_branch,
                                      extra_branches=args.branches)
 
+    if not args.force and import_upstream.is_up_to_date():
+        logger.notice("""\
+            Nothing to import: '%s' and any additional branches are already
+            merged into '%s'""", args.upstream_branch, import_upstream.branch)
+        sys.exit(NOTHING_TO_IMPORT)
+
     logger.notice("Searching for previous import")
+    # a dry-run only needs to list the commits once, so there is no need to
+    # retain them
     strategy = ImportStrategiesFactory.create_strategy(
-        args.strategy, branch=args.branch, search_ref=args.upstream_branch)
+        args.strategy, branch=args.branch, search_ref=args.upstream_branch,
+        cache=not args.dry_run, explain=args.explain or args.explain_json)
 
-    if len(strategy) == 0:
+    if strategy.is_empty():
         raise ImportUpstreamError("Cannot find previous import")
 
-    # if last commit in the strategy was a merge, then the additional branches
-    # that were merged in previously can be extracted based on the commits
-    # merged.
-    prev_import_merge = strategy[-1]
+    # if first commit in the strategy was a merge, then the additional
+    # branches that were merged in previously can be extracted based on the
+    # commits merged.
+    prev_import_merge = strategy[0]
     if len(prev_import_merge.parents) > 1:
-        idx = next((idx for idx, commit in enumerate(prev_import_merge.parents)
-                    if commit.hexsha == strategy.searcher.commit.hexsha), None)
+        idx = next((idx for idx, parent in enumerate(prev_import_merge.parents)
+                    if parent == strategy.searcher.commit.hexsha), None)
 
         if idx:
             additional_commits = prev_import_merge.parents[idx + 1:]
@@ -607,22 +809,26 @@ def do_import(args):
                     been specified on the command line for this import.\n""")
 
     if args.dry_run:
-        commit_list = [c.hexsha[:6] + " - " + c.summary[:60] +
-                       (c.summary[60:] and "...")
-                       for c in list(strategy.filtered_iter())]
         logger.notice("""\
             Requested a dry-run: printing the list of commit that should be
             rebased
-
-                %s
-            """, "\n    ".join(commit_list))
+            """)
+        for c in strategy.filtered_iter():
+            logger.notice("    %s - %s%s", c.hexsha[:6], c.summary[:60],
+                          c.summary[60:] and "...", dedent=False)
+        if strategy.stats:
+            explain(logger, strategy.stats, args.explain_json)
         return True
 
     logger.notice("Starting import of upstream")
     import_upstream.create_import(force=args.force)
     logger.notice("Successfully created import branch")
 
-    if not import_upstream.apply(strategy, args.interactive):
+    applied = import_upstream.apply(strategy, args.interactive)
+    if strategy.stats:
+        explain(logger, strategy.stats, args.explain_json)
+
+    if not applied:
         logger.notice("Import cancelled")
         return False
 
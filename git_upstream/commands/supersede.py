@@ -17,12 +17,12 @@
 
 from git_upstream.errors import GitUpstreamError
 from git_upstream.log import LogDedentMixin
-from git_upstream.lib import note
+from git_upstream.lib.changeid import ChangeIdIndex
+from git_upstream.lib.note import NotesMap
 from git_upstream.lib.utils import GitMixin
-from git_upstream.lib.searchers import CommitMessageSearcher
 from git_upstream import subcommand, log
 
-from git import BadObject, Head
+from git import BadObject, GitCommandError
 
 import inspect
 import re
@@ -88,7 +88,8 @@ class Supersede(LogDedentMixin, GitMixin):
 
         self._upstream_branch = upstream_branch
         self._change_ids = change_ids
-        git_branch = Head(self.repo, 'refs/heads/%s' % upstream_branch)
+        index = ChangeIdIndex('refs/heads/%s' % upstream_branch,
+                              repo=self.repo)
         for change_id in change_ids:
             # Check change id format
             if not re.match(Supersede.CHANGE_ID_REGEX, change_id,
@@ -98,15 +99,14 @@ class Supersede(LogDedentMixin, GitMixin):
             # Check if change id is actually present in some commit
             # reachable from <upstream_branch>
             try:
-                change_commit = CommitMessageSearcher(
-                    repo=self.repo, branch=git_branch,
-                    pattern=Supersede.CHANGE_ID_HEADER_REGEX_FMT %
-                    change_id).find()
-
+                change_commits = index.lookup(change_id)
+            except GitCommandError:
+                raise SupersedeError("Invalid upstream branch '%s'" %
+                                     upstream_branch)
+            if change_commits:
                 self.log.debug("Change-id '%s' found in commit '%s'" %
-                               (change_id, change_commit))
-
-            except RuntimeError:
+                               (change_id, change_commits[0]))
+            else:
                 if force:
                     self.log.warn("Warning: change-id '%s' not found in '%s'" %
                                   (change_id, upstream_branch))
@@ -135,15 +135,16 @@ class Supersede(LogDedentMixin, GitMixin):
         Check if a supersede header is already present in the note containing
         one of change ids passed on the command line
         """
-        note = self.commit.note(note_ref=Supersede.NOTE_REF)
+        note = NotesMap(Supersede.NOTE_REF,
+                        repo=self.repo).get(self.commit.hexsha)
         if note:
-            pattern = '^%s\s?(%s)$' % (Supersede.SUPERSEDE_HEADER,
-                                       '|'.join(self.change_ids))
-            m = re.search(pattern, note, re.MULTILINE | re.IGNORECASE)
-            if m:
+            change_ids = set(c.lower() for c in self.change_ids)
+            duplicate = next((c for c in note.superseded_by
+                              if c.lower() in change_ids), None)
+            if duplicate:
                 self.log.warning(
                     ("Change-Id '%s' already present in the note for commit" +
-                     " '%s'") % (m.group(1), self.commit))
+                     " '%s'") % (duplicate, self.commit))
                 return False
         return True
 
@@ -0,0 +1,177 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.errors import GitUpstreamError
+from git_upstream.lib.utils import GitMixin, RepoSession
+from git_upstream.log import LogDedentMixin
+
+from collections import namedtuple
+
+import subprocess
+import threading
+
+# number of requests written ahead of reading their responses, kept small
+# enough that the names always fit within the pipe buffer so that writing
+# never blocks while git is waiting for its output to be read
+PIPELINE_DEPTH = 64
+
+ObjectInfo = namedtuple('ObjectInfo', ['hexsha', 'type', 'size', 'data'])
+
+
+class BatchProcess(object):
+    """
+    A persistent 'git cat-file --batch' or '--batch-check' process, speaking
+    the batch protocol over its pipes.
+
+    Requests are serialised so that the process may be shared between
+    threads.
+    """
+
+    def __init__(self, git, contents=True):
+        self._contents = contents
+        option = contents and '--batch' or '--batch-check'
+        self._proc = git.cat_file(option, istream=subprocess.PIPE,
+                                  as_process=True)
+        self._lock = threading.Lock()
+
+    def _response(self):
+        header = self._proc.stdout.readline()
+        if not header:
+            raise GitUpstreamError("git cat-file exited unexpectedly")
+
+        # names that cannot be resolved are echoed back with the reason
+        if header.endswith((" missing\n", " ambiguous\n")):
+            return None
+
+        hexsha, objtype, size = header.split()
+        size = int(size)
+        data = None
+        if self._contents:
+            data = self._proc.stdout.read(size)
+            # contents are followed by a newline
+            self._proc.stdout.read(1)
+        return ObjectInfo(hexsha, objtype, size, data)
+
+    def query(self, names):
+        """
+        Return an L{ObjectInfo} for each of the object names given, or None
+        for those that do not exist, pipelining the requests to git.
+        """
+        results = []
+        with self._lock:
+            for start in xrange(0, len(names), PIPELINE_DEPTH):
+                batch = names[start:start + PIPELINE_DEPTH]
+                self._proc.stdin.write("".join(["%s\n" % name
+                                                for name in batch]))
+                self._proc.stdin.flush()
+                results.extend(self._response() for name in batch)
+        return results
+
+    def close(self):
+        with self._lock:
+            self._proc.stdin.close()
+            self._proc.wait()
+
+
+class ObjectReader(LogDedentMixin, GitMixin):
+    """
+    Reads objects from the repository through persistent 'git cat-file'
+    processes, one for object contents and one for object information,
+    started when first needed. Each object read costs a round trip over the
+    pipes rather than starting a new git process.
+
+    Object names may be any revision expression understood by git, such as
+    'HEAD^{tree}', making the information queries a cheap replacement for
+    'git rev-parse' when resolving a single name.
+
+    Use L{ObjectReader.for_repo} to share the processes with everything else
+    reading from the same repository, through its L{RepoSession}.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        super(ObjectReader, self).__init__(*args, **kwargs)
+
+        self._batch = None
+        self._check = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_repo(cls, repo):
+        """
+        Return the reader shared by all users of the given repository.
+        """
+        return RepoSession.for_repo(repo).resource(
+            cls, lambda: cls(repo=repo))
+
+    def _process(self, contents):
+        with self._lock:
+            if contents:
+                if self._batch is None:
+                    self.log.debug("Starting git cat-file --batch")
+                    self._batch = BatchProcess(self.git, contents=True)
+                return self._batch
+
+            if self._check is None:
+                self.log.debug("Starting git cat-file --batch-check")
+                self._check = BatchProcess(self.git, contents=False)
+            return self._check
+
+    def info(self, name):
+        """
+        Return the L{ObjectInfo} for the named object without its contents,
+        or None if it does not exist.
+        """
+        return self.info_many([name])[0]
+
+    def info_many(self, names):
+        """
+        Return the L{ObjectInfo} for each of the named objects without their
+        contents, with None for any that do not exist.
+        """
+        return self._process(False).query(list(names))
+
+    def read(self, name):
+        """
+        Return the L{ObjectInfo} for the named object including its
+        contents, or None if it does not exist.
+        """
+        return self.read_many([name])[0]
+
+    def read_many(self, names):
+        """
+        Return the L{ObjectInfo} for each of the named objects including
+        their contents, with None for any that do not exist.
+        """
+        return self._process(True).query(list(names))
+
+    def resolve(self, name):
+        """
+        Return the SHA1 of the named object, or None if it does not exist.
+        """
+        info = self.info(name)
+        return info and info.hexsha
+
+    def close(self):
+        """
+        Shut down any running 'git cat-file' processes.
+        """
+        with self._lock:
+            for proc in (self._batch, self._check):
+                if proc:
+                    proc.close()
+            self._batch = self._check = None
@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.reachability import ReachabilityIndex
+from git_upstream.lib.utils import GitMixin
+from git_upstream.lib.walker import CommitWalker
+from git_upstream.log import LogDedentMixin
+
+import os
+
+# stored under the git directory, one file per reference indexed
+CHANGE_ID_INDEX_DIR = "git-upstream/change-ids"
+
+
+class ChangeIdIndex(LogDedentMixin, GitMixin):
+    """
+    Index of the Change-Ids contained in the footers of all commits reachable
+    from a reference, mapping each Change-Id to the commit(s) carrying it.
+
+    The index is persisted under '.git/git-upstream/change-ids' together with
+    the SHA1 of the reference tip it describes. When the tip moves forward
+    only the newly reachable commits are parsed, and if it was rewound or
+    rewritten the index is rebuilt from scratch.
+
+    :param string ref: git reference whose history is to be indexed.
+    """
+
+    def __init__(self, ref, *args, **kwargs):
+
+        super(ChangeIdIndex, self).__init__(*args, **kwargs)
+
+        self._ref = ref
+        self._tip = None
+        self._entries = None
+
+        refname = self.git.rev_parse(ref, symbolic_full_name=True,
+                                     with_exceptions=False) or ref
+        self._path = os.path.join(self.repo.git_dir, CHANGE_ID_INDEX_DIR,
+                                  *refname.split('/'))
+
+    @property
+    def ref(self):
+        """Reference whose history is indexed."""
+        return self._ref
+
+    @property
+    def tip(self):
+        """SHA1 of the reference tip the index is up to date with."""
+        if self._entries is None:
+            self.update()
+        return self._tip
+
+    def _load(self):
+
+        entries = {}
+        tip = None
+        if os.path.exists(self._path):
+            with open(self._path) as index:
+                tip = index.readline().strip() or None
+                for line in index:
+                    change_id, sha1 = line.rstrip('\n').rsplit(' ', 1)
+                    entries.setdefault(change_id, []).append(sha1)
+
+        return tip, entries
+
+    def _save(self):
+
+        if not os.path.exists(os.path.dirname(self._path)):
+            os.makedirs(os.path.dirname(self._path))
+
+        # write to a temporary file first so that an interrupted update
+        # never leaves a truncated index behind
+        tmp_path = self._path + ".lock"
+        with open(tmp_path, "w") as index:
+            index.write("%s\n" % self._tip)
+            for change_id, commits in self._entries.iteritems():
+                for sha1 in commits:
+                    index.write("%s %s\n" % (change_id, sha1))
+        os.rename(tmp_path, self._path)
+
+    def update(self):
+        """
+        Bring the index up to date with the current tip of the reference,
+        only parsing those commits added since the index was last updated.
+        """
+        tip = self.git.rev_parse(self.ref)
+        old_tip, entries = self._load()
+
+        if old_tip == tip:
+            self._tip, self._entries = tip, entries
+            return
+
+        rev_list_args = [tip]
+        if old_tip and self.is_ancestor(old_tip, tip):
+            self.log.debug("Updating Change-Id index for '%s' from %s to %s",
+                           self.ref, old_tip, tip)
+            rev_list_args.extend(["--not", old_tip])
+        else:
+            self.log.debug("Building Change-Id index for '%s' at %s",
+                           self.ref, tip)
+            entries = {}
+
+        walker = CommitWalker(note_ref=None, repo=self.repo)
+        for commit in walker.walk(*rev_list_args):
+            if commit.change_id:
+                entries.setdefault(commit.change_id, []).append(commit.hexsha)
+
+        self._tip, self._entries = tip, entries
+        self._save()
+
+    def lookup(self, change_id):
+        """
+        Return the list of commit SHA1s whose footer contains the given
+        Change-Id, or an empty list if there are none.
+        """
+        if self._entries is None:
+            self.update()
+        return self._entries.get(change_id, [])
+
+    def contains(self, change_id, limit=None):
+        """
+        Check whether the given Change-Id is present in the history of the
+        reference, optionally ignoring any commits reachable from the commit
+        SHA1 given as 'limit'.
+        """
+        commits = self.lookup(change_id)
+        if not limit or not commits:
+            return bool(commits)
+
+        # the commits found are all in the history of the reference, as
+        # usually is the limit, so use its reachability index to avoid
+        # asking git about each of them
+        reachability = ReachabilityIndex.for_ref(self.repo, self.ref)
+        reachability.update()
+        if limit in reachability and all(c in reachability for c in commits):
+            return any(not reachability.is_reachable(sha1, limit)
+                       for sha1 in commits)
+        return any(not self.is_ancestor(sha1, limit) for sha1 in commits)
+
+    def __contains__(self, change_id):
+        return self.contains(change_id)
@@ -0,0 +1,340 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.refs import common_git_dir
+from git_upstream.lib.utils import RepoSession
+from gitdb.util import bin_to_hex, hex_to_bin
+
+import heapq
+import mmap
+import os
+import struct
+
+GRAPH_SIGNATURE = 'CGPH'
+GRAPH_VERSION = 1
+# only SHA1 repositories are supported
+HASH_VERSION = 1
+HASH_LEN = 20
+
+CHUNK_OID_FANOUT = 'OIDF'
+CHUNK_OID_LOOKUP = 'OIDL'
+CHUNK_COMMIT_DATA = 'CDAT'
+CHUNK_EXTRA_EDGES = 'EDGE'
+
+# parent positions with special meanings in the commit data
+PARENT_NONE = 0x70000000
+PARENT_EXTRA_EDGES = 0x80000000
+EDGE_LAST = 0x80000000
+
+COMMIT_DATA_LEN = HASH_LEN + 16
+
+
+class GraphLayer(object):
+    """
+    A single commit-graph file, mapped into memory and read in place.
+
+    :param str path: path of the commit-graph file.
+    :param int base: number of commits in the layers this one is based on,
+                     which are counted before its own in parent positions.
+    """
+
+    def __init__(self, path, base=0):
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.base = base
+
+        signature, version, hash_version, chunks, _ = struct.unpack_from(
+            '>4sBBBB', self._data, 0)
+        if (signature != GRAPH_SIGNATURE or version != GRAPH_VERSION or
+                hash_version != HASH_VERSION):
+            self.close()
+            raise ValueError("Unsupported commit-graph file: '%s'" % path)
+
+        self._chunks = {}
+        for idx in xrange(chunks):
+            chunk_id, offset = struct.unpack_from('>4sQ', self._data,
+                                                  8 + idx * 12)
+            self._chunks[chunk_id] = offset
+        for chunk_id in (CHUNK_OID_FANOUT, CHUNK_OID_LOOKUP,
+                         CHUNK_COMMIT_DATA):
+            if chunk_id not in self._chunks:
+                self.close()
+                raise ValueError("Missing '%s' chunk in commit-graph file: "
+                                 "'%s'" % (chunk_id, path))
+
+        self._fanout = self._chunks[CHUNK_OID_FANOUT]
+        self._lookup = self._chunks[CHUNK_OID_LOOKUP]
+        self._commits = self._chunks[CHUNK_COMMIT_DATA]
+        self._edges = self._chunks.get(CHUNK_EXTRA_EDGES)
+        self.count = struct.unpack_from('>L', self._data,
+                                        self._fanout + 255 * 4)[0]
+
+    def find(self, binsha):
+        """
+        Return the position of the commit within the layer, or None if it
+        is not in it.
+        """
+        first = ord(binsha[0])
+        lo = first and struct.unpack_from(
+            '>L', self._data, self._fanout + (first - 1) * 4)[0]
+        hi = struct.unpack_from('>L', self._data, self._fanout + first * 4)[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._lookup + mid * HASH_LEN
+            oid = self._data[start:start + HASH_LEN]
+            if oid < binsha:
+                lo = mid + 1
+            elif oid > binsha:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def binsha(self, idx):
+        start = self._lookup + idx * HASH_LEN
+        return self._data[start:start + HASH_LEN]
+
+    def commit(self, idx):
+        """
+        Return the parent positions, topological level and commit time of
+        the commit at the position within the layer.
+        """
+        parent1, parent2, generation, time = struct.unpack_from(
+            '>LLLL', self._data, self._commits + idx * COMMIT_DATA_LEN +
+            HASH_LEN)
+        parents = []
+        if parent1 != PARENT_NONE:
+            parents.append(parent1)
+        if parent2 & PARENT_EXTRA_EDGES:
+            # octopus merges list the remaining parents in the edge chunk
+            offset = self._edges + (parent2 & ~PARENT_EXTRA_EDGES) * 4
+            while True:
+                edge = struct.unpack_from('>L', self._data, offset)[0]
+                parents.append(edge & ~EDGE_LAST)
+                if edge & EDGE_LAST:
+                    break
+                offset += 4
+        elif parent2 != PARENT_NONE:
+            parents.append(parent2)
+        # the top 30 bits hold the level and the remaining 34 the time
+        return parents, generation >> 2, ((generation & 3) << 32) | time
+
+    def close(self):
+        self._data.close()
+
+
+class CommitGraphFile(object):
+    """
+    Reader for the commit-graph written by 'git commit-graph write', or by
+    'git gc' when enabled, either as a single file or as a chain of split
+    layers, answering the merge-base queries made when searching for the
+    upstream commit last imported without running git.
+
+    The generation number used is the topological level, which is always
+    greater for a commit than for any of its ancestors, so that a walk
+    looking for a commit can stop at any commit with a lower generation.
+    The queries below make use of this to only read the part of the history
+    that can affect their result, and order their results most recent first
+    by generation and commit date.
+
+    The file only covers the commits that existed when it was written, but
+    includes all ancestors of each, so it can answer any query about
+    commits it contains. Callers should check for the commits involved and
+    fall back to asking git when any are missing.
+    """
+
+    def __init__(self, layers):
+        self._layers = layers
+
+    @classmethod
+    def open(cls, objects_dir):
+        """
+        Return a reader for the commit-graph in the object directory given,
+        or None if there is none that can be read.
+        """
+        info_dir = os.path.join(objects_dir, 'info')
+        paths = []
+        single = os.path.join(info_dir, 'commit-graph')
+        if os.path.isfile(single):
+            paths.append(single)
+        else:
+            graphs_dir = os.path.join(info_dir, 'commit-graphs')
+            try:
+                with open(os.path.join(graphs_dir,
+                                       'commit-graph-chain')) as f:
+                    paths.extend(
+                        os.path.join(graphs_dir, 'graph-%s.graph' % line)
+                        for line in f.read().split())
+            except IOError:
+                pass
+
+        layers = []
+        try:
+            for path in paths:
+                layers.append(GraphLayer(path, base=sum(
+                    layer.count for layer in layers)))
+        except (IOError, ValueError, struct.error):
+            for layer in layers:
+                layer.close()
+            return None
+        return layers and cls(layers) or None
+
+    @classmethod
+    def for_repo(cls, repo):
+        """
+        Return the reader shared by all users of the given repository, or
+        None if it has no commit-graph.
+        """
+        return RepoSession.for_repo(repo).resource(
+            cls, lambda: cls.open(os.path.join(common_git_dir(repo.git_dir),
+                                               'objects')))
+
+    def __len__(self):
+        return sum(layer.count for layer in self._layers)
+
+    def _find(self, sha1):
+        binsha = hex_to_bin(sha1)
+        for layer in self._layers:
+            idx = layer.find(binsha)
+            if idx is not None:
+                return layer.base + idx
+        return None
+
+    def __contains__(self, sha1):
+        return self._find(sha1) is not None
+
+    def _pos(self, sha1):
+        pos = self._find(sha1)
+        if pos is None:
+            raise ValueError("Commit not in commit-graph: '%s'" % sha1)
+        return pos
+
+    def _layer(self, pos):
+        for layer in reversed(self._layers):
+            if pos >= layer.base:
+                return layer, pos - layer.base
+
+    def _commit(self, pos):
+        layer, idx = self._layer(pos)
+        return layer.commit(idx)
+
+    def _sha1(self, pos):
+        layer, idx = self._layer(pos)
+        return bin_to_hex(layer.binsha(idx))
+
+    def _parents(self, pos):
+        return self._commit(pos)[0]
+
+    def _generation(self, pos):
+        return self._commit(pos)[1]
+
+    def parents(self, sha1):
+        """Return the SHA1s of the parents of the commit."""
+        return [self._sha1(p) for p in self._parents(self._pos(sha1))]
+
+    def _below(self, nodes, floor):
+        """
+        Return the positions strictly reachable from any of those given,
+        not walking beyond commits with a generation lower than 'floor'.
+        """
+        below = set()
+        stack = [p for node in nodes for p in self._parents(node)]
+        while stack:
+            node = stack.pop()
+            if node in below:
+                continue
+            parents, generation, _ = self._commit(node)
+            if generation < floor:
+                continue
+            below.add(node)
+            stack.extend(parents)
+        return below
+
+    def _recent_first(self, nodes):
+        return sorted(nodes, key=lambda n: self._commit(n)[1:], reverse=True)
+
+    def _independent(self, nodes):
+        nodes = set(nodes)
+        if len(nodes) < 2:
+            return list(nodes)
+        floor = min(self._generation(node) for node in nodes)
+        return list(nodes - self._below(nodes, floor))
+
+    def merge_bases(self, *sha1s):
+        """
+        Return the best common ancestors of the commits, as 'git merge-base
+        --all' does, most recent first. Unrelated commits have none.
+
+        Commits are visited in order of generation, each painted with the
+        commits given that reach it, stopping once every commit still to be
+        visited is below one found to be common to all.
+        """
+        nodes = [self._pos(sha1) for sha1 in sha1s]
+        if not nodes:
+            return []
+        common = (1 << len(nodes)) - 1
+        stale = 1 << len(nodes)
+
+        flags = {}
+        for bit, node in enumerate(nodes):
+            flags[node] = flags.get(node, 0) | 1 << bit
+        queue = [(-self._generation(node), node) for node in flags]
+        heapq.heapify(queue)
+        queued = set(flags)
+        active = len(queued)
+
+        results = []
+        while active:
+            _, node = heapq.heappop(queue)
+            queued.remove(node)
+            paint = flags[node]
+            if not paint & stale:
+                active -= 1
+                if paint & common == common:
+                    results.append(node)
+                    paint |= stale
+                    flags[node] = paint
+            for parent in self._parents(node):
+                old = flags.get(parent, 0)
+                new = old | paint
+                if new == old:
+                    continue
+                flags[parent] = new
+                if parent in queued:
+                    if new & stale and not old & stale:
+                        active -= 1
+                else:
+                    queued.add(parent)
+                    heapq.heappush(queue, (-self._generation(parent), parent))
+                    if not new & stale:
+                        active += 1
+
+        return [self._sha1(pos) for pos in
+                self._recent_first(self._independent(results))]
+
+    def independent(self, sha1s):
+        """
+        Return the commits given that are not reachable from any of the
+        others, as 'git merge-base --independent' does, most recent first.
+        """
+        return [self._sha1(node) for node in self._recent_first(
+            self._independent(self._pos(sha1) for sha1 in sha1s))]
+
+    def close(self):
+        for layer in self._layers:
+            layer.close()
+        self._layers = []
@@ -0,0 +1,168 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.gitcache import CachingGit
+
+import threading
+
+# section holding the git-upstream specific settings
+UPSTREAM_SECTION = 'upstream'
+
+TRUE_VALUES = frozenset(['true', 'yes', 'on', '1'])
+FALSE_VALUES = frozenset(['false', 'no', 'off', '0', ''])
+
+INT_SUFFIXES = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def normalize_name(name):
+    """
+    Returns the config variable name in the form listed by git, where the
+    section and variable name are case insensitive but any subsection is not.
+    """
+    parts = name.split('.')
+    if len(parts) < 2:
+        return name.lower()
+    parts[0] = parts[0].lower()
+    parts[-1] = parts[-1].lower()
+    return '.'.join(parts)
+
+
+def parse_bool(value):
+    """
+    Convert a git config value to a boolean as git does, where a variable
+    given without a value is true.
+    """
+    if value is None:
+        return True
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValueError("Invalid boolean value: '%s'" % value)
+
+
+def parse_int(value):
+    """
+    Convert a git config value to an integer as git does, allowing a 'k',
+    'm' or 'g' suffix to scale the value.
+    """
+    if value is None:
+        raise ValueError("Missing integer value")
+    value = value.strip()
+    scale = INT_SUFFIXES.get(value[-1:].lower(), 1)
+    if scale != 1:
+        value = value[:-1]
+    return int(value) * scale
+
+
+class GitConfig(object):
+    """
+    Snapshot of the git configuration, read with a single
+    'git config --list -z' the first time a setting is needed.
+
+    Variables may be given multiple times, so each name maps to the list of
+    values in the order git lists them, with the last taking precedence.
+
+    If the git command handle given tracks changes made to the repository
+    through a L{GitCache}, the snapshot is read again after any such change,
+    otherwise it may be refreshed explicitly with reload().
+
+    :param Git git: git command handle to read the configuration with.
+    """
+
+    def __init__(self, git):
+        self._git = git
+        self._values = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _generation_now(self):
+        # a plain git handle would run 'git cache' for the attribute
+        if isinstance(self._git, CachingGit):
+            return self._git.cache.generation
+
+    def _load(self):
+        values = {}
+        # a repository without any configuration results in an error
+        output = self._git.config(list=True, z=True, with_exceptions=False)
+        for entry in output.split('\0'):
+            if not entry:
+                continue
+            # variables without a value are listed without the newline
+            if '\n' in entry:
+                name, value = entry.split('\n', 1)
+            else:
+                name, value = entry, None
+            values.setdefault(normalize_name(name), []).append(value)
+        return values
+
+    @property
+    def values(self):
+        """Mapping of each variable name to the list of its values."""
+        with self._lock:
+            generation = self._generation_now()
+            if self._values is None or generation != self._generation:
+                self._values = self._load()
+                self._generation = generation
+            return self._values
+
+    def reload(self):
+        """Discard the snapshot, reading it again when next needed."""
+        with self._lock:
+            self._values = None
+
+    def get(self, name, default=None):
+        """
+        Return the value that takes effect for the variable, or 'default' if
+        it is not set. Variables set without a value are returned as None.
+        """
+        values = self.values.get(normalize_name(name))
+        if not values:
+            return default
+        return values[-1]
+
+    def get_all(self, name):
+        """Return the list of all values given for the variable."""
+        return list(self.values.get(normalize_name(name), []))
+
+    def get_bool(self, name, default=False):
+        """Return the variable as a boolean, or 'default' if it is not set."""
+        if name not in self:
+            return default
+        return parse_bool(self.get(name))
+
+    def get_int(self, name, default=None):
+        """Return the variable as an integer, or 'default' if it is not set."""
+        if name not in self:
+            return default
+        return parse_int(self.get(name))
+
+    def section(self, section=UPSTREAM_SECTION):
+        """
+        Return a mapping of the variables under the given section, which
+        defaults to the git-upstream settings, to the value that takes effect
+        for each, keyed by the remainder of the name after the section.
+        """
+        # only the section itself is case insensitive, not any subsection
+        section, _, subsection = section.partition('.')
+        prefix = section.lower() + (subsection and '.' + subsection) + '.'
+        return dict((name[len(prefix):], values[-1])
+                    for name, values in self.values.iteritems()
+                    if name.startswith(prefix))
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.values
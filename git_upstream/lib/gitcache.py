@@ -0,0 +1,274 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git import Git
+
+import os
+import threading
+
+# commands that only query the repository, and so may have their results
+# reused until something changes it
+QUERY_COMMANDS = frozenset(['describe', 'for_each_ref', 'merge_base',
+                            'name_rev', 'rev_list', 'rev_parse', 'show_ref',
+                            'var'])
+
+# commands that read a setting or reference when given a single name, but
+# change it when also given a value
+GETTER_COMMANDS = frozenset(['config', 'symbolic_ref'])
+
+# options for which the getter commands only read, listing all settings
+# when 'list' is given without a name
+GETTER_OPTIONS = frozenset(['get', 'list', 'q', 'z'])
+
+# commands that don't change the repository but whose results are not worth
+# keeping, usually as they are streamed or only asked for once
+READ_COMMANDS = frozenset(['cat_file', 'diff', 'log', 'ls_files', 'ls_tree',
+                           'show', 'status', 'version'])
+
+# options that only change how a command is run, not its result
+EXECUTE_OPTIONS = frozenset(['with_exceptions', 'with_extended_output',
+                             'stdout_as_string'])
+
+# options that mean the command output is not returned as a result
+STREAM_OPTIONS = frozenset(['as_process', 'istream', 'output_stream'])
+
+
+# the counter that git commands run through a L{CachingGit} by each thread
+# are added to, if any
+_git_counters = threading.local()
+
+
+class GitCommandCounter(object):
+    """
+    Number of git commands run through L{CachingGit} handles by the threads
+    counting into it with L{count_git_commands}, so that the commands run by
+    one stage of processing can be told apart from those run by others at
+    the same time.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+
+def current_git_counter():
+    """
+    Return the L{GitCommandCounter} that git commands run by the current
+    thread are added to, or None.
+    """
+    return getattr(_git_counters, 'counter', None)
+
+
+def count_git_commands(counter, func, *args, **kwargs):
+    """
+    Call 'func' with the given arguments, adding any git commands it runs
+    in the current thread to 'counter' rather than to the counter currently
+    in use, or to no counter if None.
+    """
+    previous = current_git_counter()
+    _git_counters.counter = counter
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _git_counters.counter = previous
+
+
+class GitCache(object):
+    """
+    Results of git queries, shared by all L{CachingGit} handles for a
+    repository and counting how often a result could be reused.
+
+    Given the git directory, results are also discarded whenever the
+    modification times of HEAD, the configuration, 'packed-refs' or any
+    directory under 'refs' change, so that changes made by other processes
+    or through other handles are seen. Files are replaced rather than
+    rewritten when git updates them, changing the directory holding them,
+    but a change made within the timestamp granularity of the filesystem
+    of the previous check may still be missed.
+
+    :param string git_dir: git directory of the repository, or None to only
+                           discard results for commands run through the
+                           L{CachingGit} handles sharing the cache.
+    :param string common_dir: directory holding the references shared by
+                              all worktrees, defaults to 'git_dir'.
+    """
+
+    def __init__(self, git_dir=None, common_dir=None):
+        self._results = {}
+        self._lock = threading.Lock()
+        self._git_dir = git_dir
+        self._common_dir = common_dir or git_dir
+        self._generation = 0
+        self._state = self._read_state()
+        self.hits = 0
+        self.misses = 0
+
+    def _read_state(self):
+        """
+        Return the state of the files and directories that change along
+        with the repository references or configuration, or None if the git
+        directory is not known.
+        """
+        if self._git_dir is None:
+            return None
+
+        state = []
+        for path in (os.path.join(self._git_dir, 'HEAD'),
+                     os.path.join(self._git_dir, 'config.worktree'),
+                     os.path.join(self._common_dir, 'config'),
+                     os.path.join(self._common_dir, 'packed-refs')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                state.append(None)
+            else:
+                state.append((st.st_ino, st.st_size, st.st_mtime))
+        for dirpath, _, _ in os.walk(os.path.join(self._common_dir, 'refs')):
+            try:
+                state.append((dirpath, os.stat(dirpath).st_mtime))
+            except OSError:
+                state.append((dirpath, None))
+        return tuple(state)
+
+    def _check(self):
+        # must be called with the lock held
+        state = self._read_state()
+        if state != self._state:
+            self._state = state
+            self._results.clear()
+            self._generation += 1
+
+    @property
+    def generation(self):
+        """
+        Number incremented each time the cached results are discarded.
+        """
+        with self._lock:
+            self._check()
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            self._check()
+            try:
+                result = self._results[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            return result
+
+    def set(self, key, result, generation):
+        """
+        Store the result of a query, unless the cache was invalidated since
+        the given generation while the query was running.
+        """
+        with self._lock:
+            if generation == self._generation:
+                self._results[key] = result
+
+    def invalidate(self):
+        with self._lock:
+            self._results.clear()
+            self._state = self._read_state()
+            self._generation += 1
+
+
+class CachingGit(Git):
+    """
+    Git command handle that reuses the results of read only queries until a
+    command that may change the repository is run through any handle sharing
+    the same L{GitCache}, or the cache sees the repository change.
+
+    Commands not known to be read only, such as 'reset', 'checkout',
+    'branch', 'commit' or 'notes', are treated as changing the repository.
+    """
+
+    def __init__(self, working_dir=None, cache=None):
+        super(CachingGit, self).__init__(working_dir)
+        self.cache = cache or GitCache()
+
+    def _key(self, method, args, kwargs):
+        """
+        Return the key to cache the results of the command under, or None if
+        they should not be cached.
+        """
+        if STREAM_OPTIONS.intersection(kwargs):
+            return None
+        if method in GETTER_COMMANDS:
+            options = set(kwargs) - EXECUTE_OPTIONS
+            if options - GETTER_OPTIONS:
+                return None
+            if len(args) != (0 if 'list' in options else 1):
+                return None
+        elif method not in QUERY_COMMANDS:
+            return None
+
+        key = (method, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _changes(self, method, args, kwargs):
+        """
+        Check whether the command may change the repository.
+        """
+        if method in QUERY_COMMANDS or method in READ_COMMANDS:
+            return False
+        if method in GETTER_COMMANDS:
+            return self._key(method, args, kwargs) is None
+        if method == 'notes':
+            return not set(['list', 'show']).intersection(args)
+        return True
+
+    def execute(self, *args, **kwargs):
+        counter = current_git_counter()
+        if counter is not None:
+            counter.increment()
+        return super(CachingGit, self).execute(*args, **kwargs)
+
+    def _call_process(self, method, *args, **kwargs):
+        key = self._key(method, args, kwargs)
+        if key is not None:
+            try:
+                return self.cache.get(key)
+            except KeyError:
+                pass
+            generation = self.cache.generation
+            result = super(CachingGit, self)._call_process(method, *args,
+                                                           **kwargs)
+            self.cache.set(key, result, generation)
+            return result
+
+        if not self._changes(method, args, kwargs):
+            return super(CachingGit, self)._call_process(method, *args,
+                                                         **kwargs)
+
+        # drop results both before and after in case of the command failing
+        # part way through, or other queries being made while it runs
+        self.cache.invalidate()
+        try:
+            return super(CachingGit, self)._call_process(method, *args,
+                                                         **kwargs)
+        finally:
+            self.cache.invalidate()
@@ -16,8 +16,15 @@
 #
 
 from git_upstream.errors import GitUpstreamError
+from git_upstream.lib.catfile import ObjectReader
+from git_upstream.lib.utils import GitMixin
 from git import base, GitCommandError
 
+import re
+
+DROPPED_HEADER = 'Dropped:'
+SUPERSEDE_HEADER = 'Superseded-by:'
+
 
 class NoteAlreadyExistsError(GitUpstreamError):
     """Exception thrown by note related commands"""
@@ -70,3 +77,90 @@ def note_message(self, note_ref='refs/notes/commits'):
 base.Object.add_note = add_note
 base.Object.append_note = append_note
 base.Object.note = note_message
+
+
+class Note(object):
+    """
+    Parsed contents of a note, exposing the values of the headers used by
+    git-upstream to mark commits.
+    """
+
+    _dropped_re = re.compile('^%s\s*(.+?)\s*$' % DROPPED_HEADER,
+                             re.IGNORECASE | re.MULTILINE)
+    _supersede_re = re.compile('^%s\s*(.+?)\s*$' % SUPERSEDE_HEADER,
+                               re.IGNORECASE | re.MULTILINE)
+
+    def __init__(self, message):
+        self._message = message
+        self._dropped = self._dropped_re.findall(message)
+        self._superseded_by = self._supersede_re.findall(message)
+
+    @property
+    def message(self):
+        """Full text of the note."""
+        return self._message
+
+    @property
+    def dropped(self):
+        """List of authors that marked the commit as dropped."""
+        return self._dropped
+
+    @property
+    def superseded_by(self):
+        """List of Change-Ids that the commit is superseded by."""
+        return self._superseded_by
+
+
+class NotesMap(GitMixin):
+    """
+    Map of commit SHA1 to parsed L{Note} for all notes under a notes ref.
+
+    The list of annotated objects is retrieved with a single 'git notes list'
+    the first time it is needed, and note contents are read on demand through
+    the shared L{ObjectReader} of the repository rather than spawning a
+    separate 'git notes show' for each commit.
+
+    :param string note_ref: ref to use for notes. Defaults to
+                            refs/notes/commits
+    """
+
+    def __init__(self, note_ref='refs/notes/commits', *args, **kwargs):
+
+        super(NotesMap, self).__init__(*args, **kwargs)
+
+        self._note_ref = note_ref
+        self._blobs = None
+        self._notes = {}
+
+    @property
+    def note_ref(self):
+        """Notes ref the notes are read from."""
+        return self._note_ref
+
+    @property
+    def blobs(self):
+        """Mapping of annotated object SHA1 to note blob SHA1."""
+        if self._blobs is None:
+            self._blobs = {}
+            # a missing notes ref simply results in an empty list
+            for line in self.git.notes('--ref', self.note_ref, 'list',
+                                       with_exceptions=False).splitlines():
+                blob, annotated = line.split()
+                self._blobs[annotated] = blob
+        return self._blobs
+
+    def get(self, sha1, default=None):
+        """
+        Return the parsed L{Note} attached to the given commit SHA1, or
+        'default' if the commit is not annotated.
+        """
+        if sha1 not in self._notes:
+            blob = self.blobs.get(sha1)
+            if not blob:
+                return default
+            reader = ObjectReader.for_repo(self.repo)
+            self._notes[sha1] = Note(reader.read(blob).data)
+        return self._notes[sha1]
+
+    def __contains__(self, sha1):
+        return sha1 in self.blobs
@@ -0,0 +1,306 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.utils import GitMixin, RepoSession
+from git_upstream.log import LogDedentMixin
+from gitdb.util import bin_to_hex, hex_to_bin
+
+from array import array
+
+import os
+import struct
+import threading
+import zlib
+
+# stored under the git directory, one file per reference indexed along with
+# another holding the bitmaps computed for it
+REACHABILITY_INDEX_DIR = "git-upstream/reachability"
+
+INDEX_SIGNATURE = 'GURI'
+INDEX_VERSION = 2
+INDEX_HEADER = '>4sB20sL'
+# offsets and parents are stored as fixed width 32-bit node numbers
+INDEX_ENTRIES = '>%dI'
+BITMAP_HEADER = '>20sL'
+
+
+class Bitmap(object):
+    """
+    Set of commit numbers held as one bit each.
+    """
+
+    def __init__(self, bits):
+        self._bits = bits
+
+    @classmethod
+    def decompress(cls, data):
+        return cls(bytearray(zlib.decompress(data)))
+
+    def compress(self):
+        return zlib.compress(str(self._bits))
+
+    def __contains__(self, node):
+        byte = node >> 3
+        if byte >= len(self._bits):
+            return False
+        return bool(self._bits[byte] & (1 << (node & 7)))
+
+
+class ReachabilityIndex(LogDedentMixin, GitMixin):
+    """
+    Index of all commits reachable from a reference, answering whether one
+    of them is an ancestor of another without walking the history.
+
+    Commits are numbered in the order they are added, always after their
+    parents, and the numbering is kept as the reference advances, with only
+    the newly reachable commits added. The commits reachable from any commit
+    in the index are held as a bitmap over the numbers, computed once from
+    the parents recorded, after which each ancestry check is a bit test.
+    Since later commits can never be ancestors of earlier ones, bitmaps stay
+    valid as commits are added.
+
+    The numbering, parents and bitmaps are persisted under
+    '.git/git-upstream/reachability', and are rebuilt should the reference
+    be rewound or rewritten.
+
+    Use L{ReachabilityIndex.for_ref} to share the index with everything else
+    checking ancestry in the same history.
+
+    :param string ref: git reference whose history is to be indexed.
+    """
+
+    def __init__(self, ref, *args, **kwargs):
+
+        super(ReachabilityIndex, self).__init__(*args, **kwargs)
+
+        self._ref = ref
+        self._tip = None
+        self._binshas = None
+        self._ids = None
+        self._offsets = None
+        self._parents = None
+        self._bitmaps = {}
+        self._lock = threading.RLock()
+
+        refname = self.git.rev_parse(ref, symbolic_full_name=True,
+                                     with_exceptions=False) or ref
+        self._path = os.path.join(self.repo.git_dir, REACHABILITY_INDEX_DIR,
+                                  *refname.split('/'))
+        self._bitmaps_path = self._path + ".bitmaps"
+
+    @classmethod
+    def for_ref(cls, repo, ref):
+        """
+        Return the index of the reference shared by all users of the given
+        repository.
+        """
+        return RepoSession.for_repo(repo).resource(
+            (cls, ref), lambda: cls(ref, repo=repo))
+
+    @property
+    def ref(self):
+        """Reference whose history is indexed."""
+        return self._ref
+
+    @property
+    def tip(self):
+        """SHA1 of the reference tip the index is up to date with."""
+        if self._binshas is None:
+            self.update()
+        return self._tip
+
+    def __len__(self):
+        if self._binshas is None:
+            self.update()
+        return len(self._binshas)
+
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as index:
+                data = index.read()
+            signature, version, tip, count = struct.unpack_from(
+                INDEX_HEADER, data)
+            if signature != INDEX_SIGNATURE or version != INDEX_VERSION:
+                return False
+            pos = struct.calcsize(INDEX_HEADER)
+            binshas = [data[start:start + 20]
+                       for start in xrange(pos, pos + count * 20, 20)]
+            pos += count * 20
+            offsets = array('I', struct.unpack_from(
+                INDEX_ENTRIES % (count + 1), data, pos))
+            pos += struct.calcsize(INDEX_ENTRIES % (count + 1))
+            parents = array('I', struct.unpack_from(
+                INDEX_ENTRIES % offsets[-1], data, pos))
+            pos += struct.calcsize(INDEX_ENTRIES % offsets[-1])
+        except (IOError, struct.error, ValueError):
+            return False
+        if pos != len(data):
+            return False
+
+        self._tip = bin_to_hex(tip)
+        self._binshas = binshas
+        self._ids = dict((binsha, node) for node, binsha in
+                         enumerate(binshas))
+        self._offsets = offsets
+        self._parents = parents
+        self._bitmaps = {}
+        return True
+
+    def _save(self):
+        if not os.path.exists(os.path.dirname(self._path)):
+            os.makedirs(os.path.dirname(self._path))
+
+        # write to a temporary file first so that an interrupted update
+        # never leaves a truncated index behind
+        tmp_path = self._path + ".lock"
+        with open(tmp_path, 'wb') as index:
+            index.write(struct.pack(INDEX_HEADER, INDEX_SIGNATURE,
+                                    INDEX_VERSION, hex_to_bin(self._tip),
+                                    len(self._binshas)))
+            index.write("".join(self._binshas))
+            index.write(struct.pack(INDEX_ENTRIES % len(self._offsets),
+                                    *self._offsets))
+            index.write(struct.pack(INDEX_ENTRIES % len(self._parents),
+                                    *self._parents))
+        os.rename(tmp_path, self._path)
+
+    def _reset(self):
+        self._binshas = []
+        self._ids = {}
+        self._offsets = array('I', [0])
+        self._parents = array('I')
+        self._bitmaps = {}
+        # bitmaps are only valid for the numbering they were computed with
+        if os.path.exists(self._bitmaps_path):
+            os.remove(self._bitmaps_path)
+
+    def update(self):
+        """
+        Bring the index up to date with the current tip of the reference,
+        only adding those commits made reachable since it was last updated.
+        """
+        with self._lock:
+            tip = self.git.rev_parse(self.ref)
+            if self._binshas is None and not self._load():
+                self._tip = None
+                self._reset()
+
+            if self._tip == tip:
+                return
+
+            rev_list_args = [tip]
+            if self._tip and self.is_ancestor(self._tip, tip):
+                self.log.debug("Updating reachability index for '%s' from "
+                               "%s to %s", self.ref, self._tip, tip)
+                rev_list_args.extend(["--not", self._tip])
+            else:
+                self.log.debug("Building reachability index for '%s' at %s",
+                               self.ref, tip)
+                self._reset()
+
+            # list parents before their children so that each commit is
+            # numbered after all of its parents
+            proc = self.git.rev_list(*rev_list_args, topo_order=True,
+                                     reverse=True, parents=True,
+                                     as_process=True)
+            for line in proc.stdout:
+                shas = [hex_to_bin(sha1) for sha1 in line.split()]
+                self._ids[shas[0]] = len(self._binshas)
+                self._binshas.append(shas[0])
+                self._parents.extend(self._ids[p] for p in shas[1:])
+                self._offsets.append(len(self._parents))
+            proc.wait()
+
+            self._tip = tip
+            self._save()
+
+    def _node(self, sha1):
+        if self._binshas is None:
+            self.update()
+        return self._ids.get(hex_to_bin(sha1))
+
+    def __contains__(self, sha1):
+        return self._node(sha1) is not None
+
+    def _load_bitmaps(self):
+        bitmaps = {}
+        try:
+            with open(self._bitmaps_path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return bitmaps
+        pos = 0
+        header_len = struct.calcsize(BITMAP_HEADER)
+        # ignore any incomplete record left by an interrupted write
+        while pos + header_len <= len(data):
+            binsha, length = struct.unpack_from(BITMAP_HEADER, data, pos)
+            pos += header_len
+            if pos + length > len(data):
+                break
+            bitmaps[binsha] = data[pos:pos + length]
+            pos += length
+        return bitmaps
+
+    def _compute(self, node):
+        bits = bytearray((node >> 3) + 1)
+        bits[node >> 3] |= 1 << (node & 7)
+        offsets = self._offsets
+        parents = self._parents
+        # parents are always numbered before their children
+        for current in xrange(node, -1, -1):
+            if bits[current >> 3] & (1 << (current & 7)):
+                for parent in parents[offsets[current]:offsets[current + 1]]:
+                    bits[parent >> 3] |= 1 << (parent & 7)
+        return Bitmap(bits)
+
+    def reachable(self, sha1):
+        """
+        Return the L{Bitmap} of the numbers of the commits reachable from
+        the given commit, including itself, or None if it is not in the
+        index. Bitmaps are persisted for reuse as they are computed.
+        """
+        with self._lock:
+            node = self._node(sha1)
+            if node is None:
+                return None
+            binsha = self._binshas[node]
+            if not self._bitmaps:
+                self._bitmaps = self._load_bitmaps()
+            bitmap = self._bitmaps.get(binsha)
+            if isinstance(bitmap, Bitmap):
+                return bitmap
+            if bitmap is not None:
+                bitmap = self._bitmaps[binsha] = Bitmap.decompress(bitmap)
+                return bitmap
+
+            bitmap = self._bitmaps[binsha] = self._compute(node)
+            data = bitmap.compress()
+            with open(self._bitmaps_path, 'ab') as f:
+                f.write(struct.pack(BITMAP_HEADER, binsha, len(data)) + data)
+            return bitmap
+
+    def is_reachable(self, ancestor, sha1):
+        """
+        Check whether the commit 'ancestor' is reachable from the commit
+        'sha1', both of which must be in the index.
+        """
+        node = self._node(ancestor)
+        bitmap = self.reachable(sha1)
+        if node is None or bitmap is None:
+            raise KeyError("Commit not in reachability index for '%s'" %
+                           self.ref)
+        return node in bitmap
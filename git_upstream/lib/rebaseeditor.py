@@ -15,6 +15,7 @@
 # limitations under the License.
 #
 
+from git_upstream.lib.catfile import ObjectReader
 from git_upstream.lib.utils import GitMixin
 from git_upstream.log import LogDedentMixin
 
@@ -45,7 +46,7 @@ class RebaseEditor(GitMixin, LogDedentMixin):
 
         self._interactive = interactive
 
-        super(RebaseEditor, self).__init__()
+        super(RebaseEditor, self).__init__(*args, **kwargs)
 
         self._editor = REBASE_EDITOR_SCRIPT
         # interactive switch here determines if the script that is given
@@ -81,9 +82,9 @@ class RebaseEditor(GitMixin, LogDedentMixin):
         with open(todo_file, "w") as todo:
             for commit in commits:
                 if not root:
-                    root = commit.parents[0].hexsha
-                subject = commit.message.splitlines()[0]
-                todo.write("pick %s %s\n" % (commit.hexsha[:7], subject))
+                    root = commit.parents[0]
+                todo.write("pick %s %s\n" % (commit.hexsha[:7],
+                                             commit.summary))
 
             # if root isn't set at this point, then there were no commits
             if not root:
@@ -108,7 +109,10 @@ class RebaseEditor(GitMixin, LogDedentMixin):
         if not onto:
             return "<none>"
 
-        return self.git.rev_parse(onto)[:7]
+        # fall back to rev-parse to report names that cannot be resolved
+        sha1 = (ObjectReader.for_repo(self.repo).resolve(onto) or
+                self.git.rev_parse(onto))
+        return sha1[:7]
 
     def _set_editor(self, editor):
 
@@ -185,10 +189,12 @@ class RebaseEditor(GitMixin, LogDedentMixin):
     def git_sequence_editor(self):
 
         return os.environ.get('GIT_SEQUENCE_EDITOR',
-                              self.git.config("sequence.editor",
-                                              with_exceptions=False))
+                              self.config.get("sequence.editor"))
 
     @property
     def git_editor(self):
 
-        return os.environ.get("GIT_EDITOR", self.git.var("GIT_EDITOR"))
+        # only ask git to work out the default editor if none is configured
+        return (os.environ.get("GIT_EDITOR") or
+                self.config.get("core.editor") or
+                self.git.var("GIT_EDITOR"))
@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.catfile import ObjectReader
+from git_upstream.lib.utils import GitMixin
+from git_upstream.log import LogDedentMixin
+
+import re
+
+# namespace holding a record of the last import into each branch
+IMPORT_RECORD_PREFIX = "refs/upstream-imports/"
+
+IMPORT_POINT_HEADER = 'Import-point:'
+UPSTREAM_HEADER = 'Upstream:'
+EXTRA_BRANCH_HEADER = 'Extra-branch:'
+
+
+class ImportRecord(LogDedentMixin, GitMixin):
+    """
+    Record of the last import into a branch, so that the next import can
+    start from it without searching the upstream references.
+
+    The record is a commit kept under 'refs/upstream-imports/<branch>',
+    whose parent is the merge commit that completed the import and whose
+    message lists the upstream commit imported along with the upstream and
+    additional branches merged, and their tips at the time:
+
+        Import-point: <sha1>
+        Upstream: <upstream branch> <sha1>
+        Extra-branch: <branch> <sha1>
+
+    :param string branch: branch that the import was merged into.
+    """
+
+    _header_re = re.compile('^(%s|%s|%s)\s*(.+?)\s*$' % (
+        IMPORT_POINT_HEADER, UPSTREAM_HEADER, EXTRA_BRANCH_HEADER),
+        re.MULTILINE)
+
+    def __init__(self, branch, *args, **kwargs):
+
+        super(ImportRecord, self).__init__(*args, **kwargs)
+
+        self._branch = branch
+        self._ref = None
+        refname = self.git.rev_parse(branch, symbolic_full_name=True,
+                                     with_exceptions=False)
+        # only branches can be recorded
+        if refname and refname.startswith("refs/heads/"):
+            self._ref = IMPORT_RECORD_PREFIX + refname[len("refs/heads/"):]
+
+    @property
+    def branch(self):
+        """Branch that imports are recorded for."""
+        return self._branch
+
+    @property
+    def ref(self):
+        """Reference holding the record, or None if the branch has none."""
+        return self._ref
+
+    def read(self):
+        """
+        Return a mapping of the details recorded for the last import, with
+        keys 'tip', 'import_point', 'upstream', 'upstream_tip' and
+        'extra_branches', or None if there is no readable record.
+        """
+        if not self.ref:
+            return None
+        sha1 = self.refs.get(self.ref)
+        info = sha1 and ObjectReader.for_repo(self.repo).read(sha1)
+        if not info or info.type != 'commit':
+            return None
+
+        headers, _, message = info.data.partition("\n\n")
+        parents = [line.split()[1] for line in headers.splitlines()
+                   if line.startswith("parent ")]
+        record = {'tip': parents and parents[0], 'import_point': None,
+                  'upstream': None, 'upstream_tip': None,
+                  'extra_branches': []}
+        for header, value in self._header_re.findall(message):
+            if header == IMPORT_POINT_HEADER:
+                record['import_point'] = value
+            elif header == UPSTREAM_HEADER:
+                record['upstream'], _, record['upstream_tip'] = \
+                    value.rpartition(' ')
+            else:
+                name, _, tip = value.rpartition(' ')
+                record['extra_branches'].append((name, tip))
+
+        if not (record['tip'] and record['import_point'] and
+                record['upstream']):
+            return None
+        return record
+
+    def write(self, import_point, upstream, extra_branches=None):
+        """
+        Record that the current tip of the branch completes an import of
+        the commit 'import_point' from the branch 'upstream', along with any
+        'extra_branches' merged.
+        """
+        if not self.ref:
+            return
+        tip = self.git.rev_parse(self.branch)
+        lines = ["%s %s" % (IMPORT_POINT_HEADER, import_point),
+                 "%s %s %s" % (UPSTREAM_HEADER, upstream,
+                               self.git.rev_parse(upstream))]
+        lines.extend("%s %s %s" % (EXTRA_BRANCH_HEADER, branch,
+                                   self.git.rev_parse(branch))
+                     for branch in extra_branches or [])
+        message = "Record import into '%s'\n\n%s\n" % (self.branch,
+                                                       "\n".join(lines))
+
+        self.log.info(
+            """\
+            Recording import point %s for branch '%s'
+                git update-ref %s <record>
+            """, import_point, self.branch, self.ref)
+        record = self.git.commit_tree(tip + "^{tree}", p=tip, m=message)
+        self.git.update_ref(self.ref, record,
+                            m="git-upstream: record import")
+
+    def find(self, upstream):
+        """
+        Return the import point recorded for the branch if it is still the
+        most recent commit from 'upstream' merged into the branch, or None
+        if it has to be searched for.
+
+        This holds while the branch has only gained commits that are not
+        merges since the import was recorded, and the import point remains
+        in the history of the upstream branch.
+        """
+        record = self.read()
+        if not record:
+            return None
+        if record['upstream'] != upstream:
+            self.log.debug("Import record for '%s' is of '%s' not '%s'",
+                           self.branch, record['upstream'], upstream)
+            return None
+
+        tip = self.git.rev_parse(self.branch)
+        if tip != record['tip']:
+            if not self.is_ancestor(record['tip'], tip):
+                self.log.debug("Import record for '%s' is no longer in its "
+                               "history", self.branch)
+                return None
+            if self.git.rev_list("%s..%s" % (record['tip'], tip),
+                                 merges=True, max_count=1):
+                self.log.debug("Branch '%s' has merges since its recorded "
+                               "import", self.branch)
+                return None
+
+        upstream_tip = self.git.rev_parse(upstream, with_exceptions=False)
+        if not upstream_tip or not self.is_ancestor(record['import_point'],
+                                                    upstream_tip):
+            self.log.debug("Recorded import point is no longer in '%s'",
+                           upstream)
+            return None
+
+        return record['import_point']
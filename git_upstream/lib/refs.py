@@ -0,0 +1,276 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.gitcache import CachingGit
+
+from fnmatch import fnmatchcase
+
+import mmap
+import os
+import re
+import threading
+
+# characters that make a reference pattern a glob rather than a prefix
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+# rules git uses to expand an abbreviated reference name, in order of
+# precedence, and so also to work out the shortest unambiguous name, leaving
+# out 'refs/remotes/%s/HEAD' which git never shortens a name to
+SHORT_NAME_RULES = ['%s', 'refs/%s', 'refs/tags/%s', 'refs/heads/%s',
+                    'refs/remotes/%s']
+
+
+def _rule_pattern(rule):
+    return re.compile('^' + re.escape(rule).replace(r'\%s', '(.+)') + '$')
+
+
+SHORT_NAME_PATTERNS = [_rule_pattern(rule) for rule in SHORT_NAME_RULES]
+
+
+def common_git_dir(git_dir):
+    """
+    Return the directory holding the references and objects shared by all
+    worktrees of the repository with the given git directory.
+    """
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except IOError:
+        return git_dir
+
+
+class RefSnapshot(object):
+    """
+    Snapshot of the references in a repository, read directly from the
+    'packed-refs' file and the loose references under the 'refs' directory
+    the first time a reference is needed, without running any git command.
+
+    References are held both in a mapping of the full name to its SHA1, for
+    checking whether a reference exists without scanning all of them, and
+    in a trie of the name components so that only the references under the
+    literal part of a pattern are matched against it.
+
+    If the git command handle of the repository tracks changes made to it
+    through a L{GitCache}, the snapshot is read again after any such change,
+    otherwise it may be refreshed explicitly with reload().
+
+    :param Repo repo: repository to read the references of.
+    """
+
+    def __init__(self, repo):
+        self._repo = repo
+        self._refs = None
+        self._trie = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _generation_now(self):
+        if isinstance(self._repo.git, CachingGit):
+            return self._repo.git.cache.generation
+
+    def _read_packed(self, refs, path):
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return
+        with f:
+            # an empty file cannot be mapped
+            if not os.fstat(f.fileno()).st_size:
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for line in iter(data.readline, ''):
+                    # skip the header, and the peeled values of tags which
+                    # follow the reference they belong to
+                    if line[:1] in ('#', '^'):
+                        continue
+                    sha1, _, name = line.rstrip('\n').partition(' ')
+                    if name:
+                        refs[name] = sha1
+            finally:
+                data.close()
+
+    def _read_loose(self, refs, symrefs, common_dir):
+        for dirpath, dirnames, filenames in os.walk(
+                os.path.join(common_dir, 'refs')):
+            dirnames.sort()
+            prefix = os.path.relpath(dirpath, common_dir).replace(os.sep, '/')
+            for filename in filenames:
+                if filename.endswith('.lock'):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, filename)) as f:
+                        value = f.read().strip()
+                except IOError:
+                    # removed while reading
+                    continue
+                name = prefix + '/' + filename
+                if value.startswith('ref: '):
+                    symrefs[name] = value[5:]
+                else:
+                    refs[name] = value
+
+    def _load(self):
+        common_dir = common_git_dir(self._repo.git_dir)
+        refs = {}
+        symrefs = {}
+        self._read_packed(refs, os.path.join(common_dir, 'packed-refs'))
+        # loose references take precedence over packed ones
+        self._read_loose(refs, symrefs, common_dir)
+
+        # symbolic references such as 'refs/remotes/origin/HEAD' are listed
+        # with the value of the reference they point to, if it exists
+        for name, target in symrefs.items():
+            for _ in xrange(len(symrefs)):
+                if target not in symrefs:
+                    break
+                target = symrefs[target]
+            if target in refs:
+                refs[name] = refs[target]
+
+        trie = {}
+        for name in refs:
+            node = trie
+            for part in name.split('/'):
+                node = node.setdefault(part, {})
+            node[None] = name
+        return refs, trie
+
+    def _snapshot(self):
+        with self._lock:
+            generation = self._generation_now()
+            if self._refs is None or generation != self._generation:
+                self._refs, self._trie = self._load()
+                self._generation = generation
+            return self._refs, self._trie
+
+    @property
+    def refs(self):
+        """Mapping of each full reference name to its SHA1."""
+        return self._snapshot()[0]
+
+    def reload(self):
+        """Discard the snapshot, reading it again when next needed."""
+        with self._lock:
+            self._refs = None
+
+    def get(self, name, default=None):
+        """Return the SHA1 of the fully named reference, or 'default'."""
+        return self.refs.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.refs
+
+    def _under(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for part, child in node.items():
+                if part is None:
+                    yield child
+                else:
+                    stack.append(child)
+
+    def names(self, prefix=''):
+        """
+        Return the sorted full names of the references below the given
+        prefix of whole name components, such as 'refs/tags'.
+        """
+        node = self._snapshot()[1]
+        for part in filter(None, prefix.split('/')):
+            node = node.get(part)
+            if node is None:
+                return []
+        return sorted(self._under(node))
+
+    def _glob(self, pattern):
+        parts = pattern.split('/')
+        for name in self.names(self._literal(parts)):
+            # '*' does not match across '/' unless given as '**'
+            if '**' in pattern:
+                if fnmatchcase(name, pattern):
+                    yield name
+                continue
+            names = name.split('/')
+            if len(names) == len(parts) and all(
+                    fnmatchcase(n, p) for n, p in zip(names, parts)):
+                yield name
+
+    def _literal(self, parts):
+        literal = []
+        for part in parts:
+            if GLOB_CHARS.search(part):
+                break
+            literal.append(part)
+        return '/'.join(literal)
+
+    def match(self, *patterns):
+        """
+        Return the sorted full names of the references matching any of the
+        patterns given, matched as 'git for-each-ref' does: either as a glob
+        where '*' does not match '/', or as a prefix of whole components.
+        Only the references below the leading components of a pattern that
+        contain no glob are checked against it.
+        """
+        matched = set()
+        for pattern in patterns:
+            if GLOB_CHARS.search(pattern):
+                matched.update(self._glob(pattern))
+            else:
+                matched.update(self.names(pattern))
+        return sorted(matched)
+
+    def show(self, pattern, heads=False, tags=False):
+        """
+        Return the sorted full names of the references whose trailing
+        components are the pattern given, as 'git show-ref' matches them,
+        limited to branches and/or tags if requested.
+        """
+        prefixes = [p for p, wanted in (('refs/heads', heads),
+                                        ('refs/tags', tags)) if wanted]
+        names = []
+        for prefix in prefixes or ['']:
+            names.extend(name for name in self.names(prefix)
+                         if name == pattern or
+                         name.endswith('/' + pattern.lstrip('/')))
+        return sorted(names)
+
+    def shorten(self, name, strict=True):
+        """
+        Return the shortest name that git resolves unambiguously to the full
+        reference name given, as listed by '%(refname:short)'. Unless strict,
+        following 'core.warnAmbiguousRefs', the name is only required not to
+        resolve through a rule taking precedence over the one it matched.
+        """
+        refs = self.refs
+        git_dir = self._repo.git_dir
+        for rule in xrange(len(SHORT_NAME_PATTERNS) - 1, 0, -1):
+            match = SHORT_NAME_PATTERNS[rule].match(name)
+            if not match:
+                continue
+            short = match.group(1)
+            for other in SHORT_NAME_RULES[:None if strict else rule]:
+                other = other % short
+                if other == name:
+                    continue
+                if other in refs or (
+                        other == short and
+                        os.path.isfile(os.path.join(git_dir, other))):
+                    break
+            else:
+                return short
+        return name
@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.gitcache import count_git_commands
+from git_upstream.lib.gitcache import current_git_counter
+from git_upstream.lib.utils import GitMixin
+from git_upstream.log import LogDedentMixin
+
+from multiprocessing.pool import ThreadPool
+
+# default number of git commands allowed to run at the same time
+LIMIT = 8
+
+
+class GitRunner(LogDedentMixin, GitMixin):
+    """
+    Run independent git commands concurrently, so that the time taken for a
+    set of queries is bounded by the slowest of them rather than their sum.
+
+    Each command runs in its own git process, waited on by one of a bounded
+    pool of threads, with at most 'limit' of them running at a time.
+
+    :param int limit: maximum number of git commands to run at once.
+    """
+
+    def __init__(self, limit=LIMIT, *args, **kwargs):
+
+        super(GitRunner, self).__init__(*args, **kwargs)
+
+        self._limit = limit
+
+    @property
+    def limit(self):
+        """Maximum number of git commands run at once."""
+        return self._limit
+
+    def _call(self, call):
+        command, args, kwargs = call
+        return getattr(self.git, command)(*args, **kwargs)
+
+    def gather(self, *calls):
+        """
+        Run each of the given (command, args, kwargs) calls, returning their
+        results in the same order. Commands are named as they would be when
+        called on the 'git' attribute of L{GitMixin}, and if any of them
+        raise an exception it is raised once all have completed.
+        """
+        if len(calls) < 2 or self.limit < 2:
+            return [self._call(call) for call in calls]
+
+        self.log.debug("Running %d git commands, %d at a time", len(calls),
+                       min(len(calls), self.limit))
+        # count the commands as run by the calling thread
+        counter = current_git_counter()
+        pool = ThreadPool(min(len(calls), self.limit))
+        try:
+            return pool.map(
+                lambda call: count_git_commands(counter, self._call, call),
+                calls)
+        finally:
+            pool.close()
+            pool.join()
+
+    def map(self, command, args_list, **kwargs):
+        """
+        Run the git command once for each of the tuples of arguments given,
+        all with the same keyword arguments, returning the results in the
+        same order.
+        """
+        return self.gather(*[(command, args, kwargs) for args in args_list])
@@ -15,16 +15,28 @@
 # limitations under the License.
 #
 
-from git_upstream.lib.utils import GitMixin
+from git_upstream.lib.changeid import ChangeIdIndex
+from git_upstream.lib.commitgraph import CommitGraphFile
+from git_upstream.lib.gitcache import GitCommandCounter, count_git_commands
+from git_upstream.lib.gitcache import current_git_counter
+from git_upstream.lib.record import ImportRecord
+from git_upstream.lib.runner import GitRunner
+from git_upstream.lib.utils import GitMixin, check_git_version
+from git_upstream.lib.walker import CommitWalker
 from git_upstream.log import LogDedentMixin
 
-try:
-    from git.objects.commit import Commit
-except ImportError:
-    from git_upstream.lib.pygitcompat import GitUpstreamCompatCommit as Commit
-
 from abc import ABCMeta, abstractmethod
-import re
+
+from multiprocessing.pool import ThreadPool
+
+import collections
+import itertools
+import time
+
+# relative cost of filtering each commit, used to order filter chains
+COST_FREE = 0       # only inspects details already read by the walk
+COST_INDEX = 1      # consults an index, rarely needing git
+COST_GIT = 2        # may run a git command for each commit
 
 
 class Searcher(GitMixin):
@@ -66,11 +78,11 @@ class Searcher(GitMixin):
         """
         pass
 
-    def list(self):
+    def _walk(self, reverse=False):
         """
-        Returns a list of Commit objects, between the '<commitish>' revision
-        given in the constructor, and the commit object returned by the find()
-        method.
+        Generator returning the unfiltered WalkedCommit objects between the
+        commit found by find() and the '<commitish>' revision given in the
+        constructor, oldest first if 'reverse' is set.
         """
         if not self.commit:
             self.find()
@@ -78,26 +90,51 @@ class Searcher(GitMixin):
         # walk the tree and find all commits that lie in the path between the
         # commit found by find() and head of the branch to provide a list of
         # commits to the caller
+        revs, options = self._walk_args()
         self.log.info(
             """\
             Walking the ancestry path between found commit and target
-                git rev-list --parents --ancestry-path %s..%s
-            """, self.commit.hexsha, self.branch)
+                git rev-list --parents %s %s
+            """, _ancestry_path_option(options), " ".join(revs))
+
+        # a single 'git log' process provides everything the filters need to
+        # know about each commit, so no further git calls are made per commit
+        return CommitWalker(repo=self.repo).walk(
+            *revs, topo_order=True, reverse=reverse, **options)
+
+    def _walk_args(self):
+        """
+        Returns the revisions and options with which 'git log' or 'git
+        rev-list' list the commits on the ancestry path between the commit
+        found by find() and the branch.
+        """
+        return (["{0}..{1}".format(self.commit.hexsha, self.branch)],
+                {'ancestry_path': True})
 
-        # depending on how many commits are returned, may need to examine use
-        # of a generator rather than storing the entire list. Such a generator
-        # would require a custom git object or direct use of popen
-        commit_list = Commit.iter_items(self.repo,
-                                        "{0}..{1}".format(self.commit.hexsha,
-                                                          self.branch),
-                                        topo_order=True, ancestry_path=True)
+    def iter_commits(self, reverse=False):
+        """
+        Generator returning the WalkedCommit objects that list() would return,
+        reading them from git as they are consumed rather than all up front.
+
+        Setting 'reverse' returns the commits in reverse topological order,
+        oldest first, as listed by 'git rev-list --reverse'.
+        """
+        commit_list = self._walk(reverse)
 
         # chain the filters as generators so that we don't need to allocate new
         # lists for each step in the filter chain.
         for f in self.filters:
             commit_list = f.filter(commit_list)
 
-        commits = list(commit_list)
+        return commit_list
+
+    def list(self):
+        """
+        Returns a list of WalkedCommit objects, between the '<commitish>'
+        revision given in the constructor, and the commit object returned by
+        the find() method.
+        """
+        commits = list(self.iter_commits())
 
         self.log.debug(
             """\
@@ -108,11 +145,23 @@ class Searcher(GitMixin):
         return commits
 
 
+def _ancestry_path_option(options):
+    """
+    Returns the '--ancestry-path' option as given to git for logging.
+    """
+    if options['ancestry_path'] is True:
+        return "--ancestry-path"
+    return "--ancestry-path=%s" % options['ancestry_path']
+
+
 class NullSearcher(Searcher):
     """
     This searcher returns an empty list
     """
 
+    def iter_commits(self, reverse=False):
+        return iter([])
+
     def list(self):
         return []
 
@@ -126,13 +175,20 @@ class UpstreamMergeBaseSearcher(LogDedentMixin, Searcher):
     If not restricted to search specific remotes, it will search all
     available remote references matching the pattern for the most recent merge
     base available.
+
+    When git has to be asked for the merge bases, the upstream revisions may
+    be split between 'jobs' merge-base commands run at the same time, each
+    able to use another core, which can be changed after construction.
     """
 
     def __init__(self, pattern="upstream/*", search_tags=False, remotes=None,
-                 *args, **kwargs):
+                 jobs=1, *args, **kwargs):
 
         if not remotes:
             remotes = []
+        self.jobs = jobs
+        self._previous_import = None
+        self._pin_ancestry_path = None
         self._pattern = pattern
         self._references = ["refs/heads/{0}".format(self.pattern)]
 
@@ -171,23 +227,37 @@ class UpstreamMergeBaseSearcher(LogDedentMixin, Searcher):
             refs/remotes/origin/other/upstream/area <--- undesirable
 
         Additional since 'git rev-list' doesn't accept patterns as commit refs
-        it's better to make use of 'git for-each-ref' and how it does pattern
-        matching in order to generate a list of references to pass to rev-list
-        to walk.
-
-        After determining all the references to look at, because of the
-        overhead in using 'git merge-base' to determine the last commit from
-        one of the upstream refs that was merged into the target branch, it is
-        worth going to the additional effort of removing any reference that is
-        reachable from another so that the calls to merge-base are minimized.
+        it's better to match references the way 'git for-each-ref' does in
+        order to generate a list of references to pass to rev-list to walk,
+        which is done against the snapshot of the repository references
+        rather than running another git command.
+
+        After determining all the references to look at, the history of the
+        target branch and of all the references is taken from the
+        commit-graph file of the repository if it is up to date, from which
+        any reference reachable from another is removed, and the merge bases
+        of the rest with the target branch are computed without running git.
+        Otherwise 'git merge-base' is run once to remove references reachable
+        from others, and once to find the merge bases with all of the rest.
         """
 
+        # the last import may have recorded where it was made from
+        record = ImportRecord(self.branch, repo=self.repo)
+        sha1 = record.find(self.pattern)
+        if sha1:
+            self._previous_import = record.read()['tip']
+            self.commit = self.repo.commit(sha1)
+            self.log.info("Using recorded import point: '%s'",
+                          self.commit.hexsha)
+            return self.commit.hexsha
+
         self.log.info(
             "Searching for most recent merge base with upstream branches")
 
         # process pattern given to get a list of refs to check
-        rev_list_args = self.git.for_each_ref(
-            *self._references, format="%(refname:short)").splitlines()
+        strict = self.config.get_bool("core.warnAmbiguousRefs", True)
+        rev_list_args = [self.refs.shorten(ref, strict)
+                         for ref in self.refs.match(*self._references)]
         self.log.info(
             """\
             Upstream refs:
@@ -206,67 +276,37 @@ class UpstreamMergeBaseSearcher(LogDedentMixin, Searcher):
         search_list = set(self.git.rev_list(*rev_list_args,
                                             min_parents=1,
                                             no_walk=True).splitlines())
-        rev_list_args = list(search_list)
-
-        # construct a list of the parents of each ref so that we can tell
-        # rev-list to ignore in the anything reachable from the list commits
-        # which reduces the amount of revs to be searched with merge-base
-        prune_list = []
-        for rev in search_list:
-            # only root commits won't have at least one parent which have been
-            # excluded by the previous search
-            commit = self.git.rev_list(rev, parents=True, max_count=1).split()
-            parents = commit[1:]
-            prune_list.extend(parents)
-
-        # We want to stop walking the tree and ignore all commits after each
-        # time we encounter one from the prune_list, so make sure to set the
-        # --not option followed by the list of revisions to exclude. Since
-        # python-git may reorder options if given by way or keyword args, use
-        # strings in the required order as '*args' are not reordered, and
-        # order is critical here to ensure rev-list applies the '--not'
-        # behaviour to the correct set.
-        rev_list_args.append("--not")
-        rev_list_args.extend(prune_list)
-        self.log.info(
-            """\
-            Retrieve minimal list of revs to check with merge-base by excluding
-            revisions that are in the reachable from others in the list:
-                git rev-list \\
-                    %s
-            """, " \\\n        ".join(rev_list_args))
-        revsions = self.git.rev_list(*rev_list_args).splitlines()
 
-        # Running 'git merge-base' is relatively expensive to pruning the list
-        # of revs to search since it needs to construct and walk a large
-        # portion of the tree for each call. If the constructed graph was
-        # retained betweens we could likely remove much of the code above.
-        self.log.info(
-            """\
-            Running merge-base against each found upstream revision and target
-                git merge-base %s ${upstream_rev}
-            """, self.branch)
-        merge_bases = set()
-        for rev in revsions:
-            # ignore exceptions as there may be unrelated branches picked up by
-            # the searching which would result in merge-base returning an error
-            base = self.git.merge_base(self.branch, rev, with_exceptions=False)
-            if base:
-                merge_bases.add(base)
-
-        if len(merge_bases) == 0:
+        # use the commit-graph file maintained by git where it covers all of
+        # the commits, otherwise let git compute the merge bases with all of
+        # the upstream revs at once
+        branch = self.git.rev_parse(self.branch)
+        graph = CommitGraphFile.for_repo(self.repo)
+        if graph and all(rev in graph for rev in [branch] + list(search_list)):
+            self.log.info("Using the commit-graph file of the repository")
+            candidates = self._graph_merge_bases(graph, branch, search_list)
+        else:
+            candidates = self._git_merge_bases(search_list)
+
+        # the most recent merge base irrespective of date is the one not
+        # reachable from any other, only needing git to decide between
+        # unrelated candidates in the same way as before
+        if len(candidates) == 0:
             self.log.notice("Merge-base couldn't be found: it seems there " +
                             "is no common ancestor for the involved branches")
         else:
-            self.log.info(
-                """\
-                Order the possible merge-base commits in descendent order, to
-                find the most recent one used irrespective of date:
-                    git rev-list --topo-order --max-count=1 --no-walk \\
-                        %s
-                """, (" \\\n" + " " * 8).join(merge_bases))
-            sha1 = self.git.rev_list(
-                *merge_bases, topo_order=True, max_count=1, no_walk=True)
+            sha1 = candidates[0]
+            if len(candidates) > 1:
+                self.log.info(
+                    """\
+                    Order the possible merge-base commits in descendent
+                    order, to find the most recent one used irrespective of
+                    date:
+                        git rev-list --topo-order --max-count=1 --no-walk \\
+                            %s
+                    """, (" \\\n" + " " * 8).join(candidates))
+                sha1 = self.git.rev_list(*candidates, topo_order=True,
+                                         max_count=1, no_walk=True)
             # now that we have the sha1, make sure to save the commit object
             self.commit = self.repo.commit(sha1)
             self.log.debug("Most recent merge-base commit is: '%s'",
@@ -277,6 +317,120 @@ class UpstreamMergeBaseSearcher(LogDedentMixin, Searcher):
 
         return self.commit.hexsha
 
+    def _graph_merge_bases(self, graph, branch, search_list):
+        """
+        Returns the most recent merge bases of the target branch with any of
+        the upstream revs, using the given commit graph.
+        """
+        # only revisions not reachable from others in the list need checking
+        # as any merge base with the others can be no more recent
+        revisions = graph.independent(search_list)
+        self.log.info(
+            """\
+            Minimal list of revs to check for a merge-base, excluding those
+            reachable from others in the list:
+                %s
+            """, "\n    ".join(revisions))
+
+        merge_bases = set()
+        # there may be unrelated branches picked up by the searching which
+        # will have no common ancestor with the target
+        for rev in revisions:
+            merge_bases.update(graph.merge_bases(branch, rev))
+        return graph.independent(merge_bases)
+
+    def _git_merge_bases(self, search_list):
+        """
+        Returns the most recent merge bases of the target branch with any of
+        the upstream revs, using one git command to prune the revs and one
+        to find the merge bases with all of them.
+        """
+        if not search_list:
+            return []
+
+        self.log.info(
+            """\
+            Retrieve minimal list of revs to check with merge-base by excluding
+            revisions that are reachable from others in the list:
+                git merge-base --independent \\
+                    %s
+            """, (" \\\n" + " " * 8).join(search_list))
+        revisions = self.git.merge_base(*search_list,
+                                        independent=True).splitlines()
+
+        # given several revisions, merge-base finds the best common ancestors
+        # of the first with a merge of all of the others, which are the most
+        # recent of the merge bases with each of them. Ignore exceptions as
+        # there may be unrelated branches picked up by the searching.
+        chunks = [revisions[idx::self.jobs]
+                  for idx in xrange(min(self.jobs, len(revisions)))]
+        if len(chunks) < 2:
+            self.log.info(
+                """\
+                Running merge-base against the target and all upstream revs
+                    git merge-base --all %s \\
+                        %s
+                """, self.branch, (" \\\n" + " " * 8).join(revisions))
+            return self.git.merge_base(self.branch, *revisions, all=True,
+                                       with_exceptions=False).splitlines()
+
+        # otherwise split the revisions between commands run concurrently,
+        # and reduce the merge bases found by each to the most recent
+        self.log.info(
+            """\
+            Running merge-base against the target and upstream revisions split
+            between %d commands
+                git merge-base --all %s ${upstream_revs}
+            """, len(chunks), self.branch)
+        runner = GitRunner(limit=len(chunks), repo=self.repo)
+        merge_bases = set()
+        for bases in runner.map('merge_base',
+                                [[self.branch] + chunk for chunk in chunks],
+                                all=True, with_exceptions=False):
+            merge_bases.update(bases.splitlines())
+        if len(merge_bases) < 2:
+            return list(merge_bases)
+        return self.git.merge_base(*sorted(merge_bases),
+                                   independent=True).splitlines()
+
+    def _walk_args(self):
+        """
+        Excludes everything reachable from the upstream references, and from
+        the branch as it was before a recorded import, so that git only
+        visits the commits carried on top of upstream. Otherwise git has to
+        list every commit not reachable from the found commit, including
+        the changes carried by all earlier imports, before it can keep those
+        on the ancestry path.
+
+        Each commit excluded would widen the ancestry path to include its
+        descendants, so this needs git 2.38 or later where the path can be
+        restricted to the descendants of the found commit.
+        """
+        revs, options = super(UpstreamMergeBaseSearcher, self)._walk_args()
+
+        if self._pin_ancestry_path is None:
+            self._pin_ancestry_path = check_git_version(2, 38, 0)
+        if not self._pin_ancestry_path:
+            return revs, options
+
+        exclude = set(self.refs.get(ref)
+                      for ref in self.refs.match(*self._references))
+        if self._previous_import:
+            # the first parent of the merge completing the import is the
+            # branch as it was before, all of whose changes were replaced,
+            # unless it already contained the import point
+            previous = self.git.rev_parse(self._previous_import + "^1",
+                                          with_exceptions=False)
+            if previous and not self.is_ancestor(self.commit.hexsha,
+                                                 previous):
+                exclude.add(previous)
+        exclude.discard(self.commit.hexsha)
+        if not exclude:
+            return revs, options
+
+        return (revs + ["--not"] + sorted(exclude),
+                {'ancestry_path': self.commit.hexsha})
+
     def list(self, include_all=False):
         """
         If a particular commit has been merged in mulitple times, walking the
@@ -320,10 +474,43 @@ class UpstreamMergeBaseSearcher(LogDedentMixin, Searcher):
         if include_all == True -> return ABCADC'
         """
 
-        if not include_all:
-            self.filters.insert(0, BeforeFirstParentCommitFilter(self.find()))
+        commits = list(self.iter_commits(include_all))
+
+        self.log.debug(
+            """\
+            commits found:
+                %s
+            """, ("\n" + " " * 4).join([c.hexsha for c in commits]))
+
+        return commits
+
+    def iter_commits(self, include_all=False, reverse=False):
+        """
+        Generator version of list(), reading commits from git only as they
+        are consumed.
+
+        Setting 'reverse' returns the commits oldest first. As the commit
+        BeforeFirstParentCommitFilter would stop at is then the first to be
+        kept rather than the last, the walk is read newest first up to that
+        commit and then reversed. Either way all of the commits on the path
+        are read before the first is returned, as 'git log --reverse' also
+        has to complete the walk before listing any commit, but the path is
+        only walked once.
+        """
+        if reverse and not include_all:
+            commit_list = self._walk()
+            commit_list = reversed(list(BeforeFirstParentCommitFilter(
+                self.commit.hexsha).filter(commit_list)))
+        else:
+            commit_list = self._walk(reverse)
+            if not include_all:
+                commit_list = BeforeFirstParentCommitFilter(
+                    self.commit.hexsha).filter(commit_list)
+
+        for f in self.filters:
+            commit_list = f.filter(commit_list)
 
-        return super(UpstreamMergeBaseSearcher, self).list()
+        return commit_list
 
 
 class CommitMessageSearcher(LogDedentMixin, Searcher):
@@ -351,8 +538,9 @@ class CommitMessageSearcher(LogDedentMixin, Searcher):
         commit from which to return a list of commits since this point.
         """
 
-        commits = Commit.iter_items(self.repo, self.branch, grep=self.pattern,
-                                    max_count=1, extended_regexp=True)
+        commits = CommitWalker(repo=self.repo).walk(
+            str(self.branch), grep=self.pattern, max_count=1,
+            extended_regexp=True)
 
         self.commit = next(commits, None)
         if not self.commit:
@@ -371,29 +559,94 @@ class CommitMessageSearcher(LogDedentMixin, Searcher):
         branches that would be returned by the generic upstream searcher.
         """
 
-        commits = super(CommitMessageSearcher, self).list()
-        if include:
-            commits.append(self.commit)
+        commits = list(self.iter_commits(include))
+
+        self.log.debug(
+            """\
+            commits found:
+                %s
+            """, ("\n" + " " * 4).join([c.hexsha for c in commits]))
 
         return commits
 
+    def iter_commits(self, include=True, reverse=False):
+        """
+        Generator version of list(), reading commits from git only as they
+        are consumed.
+        """
+        commit_list = super(CommitMessageSearcher, self).iter_commits(reverse)
+        if include:
+            if reverse:
+                commit_list = itertools.chain([self.commit], commit_list)
+            else:
+                commit_list = itertools.chain(commit_list, [self.commit])
+
+        return commit_list
+
 
 class CommitFilter(object):
     """
     CommitFilter instances are used to perform arbitrary filtering of commits
     returned by searchers.
+
+    Each filter declares the relative 'cost' of filtering a commit, and
+    whether it 'commutes', that is whether it only considers each commit on
+    its own so that it can be moved before or after other such filters
+    without changing the result.
+
+    Filters that are 'parallel' must be L{PerCommitFilter} instances, so
+    that the commits can be evaluated concurrently by
+    L{ParallelCommitFilter}.
     """
     __metaclass__ = ABCMeta
 
+    cost = COST_GIT
+    commutes = False
+    parallel = False
+
     def __init__(self, *args, **kwargs):
         super(CommitFilter, self).__init__(*args, **kwargs)
 
+    @property
+    def name(self):
+        """
+        Name of the filter to use when reporting on it.
+        """
+        return self.__class__.__name__
+
     @abstractmethod
     def filter(self, commit_iter):
         pass
 
 
-class SupersededCommitFilter(LogDedentMixin, GitMixin, CommitFilter):
+class PerCommitFilter(CommitFilter):
+    """
+    PerCommitFilter instances decide on each commit independently through
+    the include() method, which is safe to call from multiple threads once
+    prepare() has been called.
+    """
+
+    def prepare(self):
+        """
+        Set up any state shared when filtering commits.
+        """
+        pass
+
+    @abstractmethod
+    def include(self, commit):
+        """
+        Return whether the commit should be kept by the filter.
+        """
+        pass
+
+    def filter(self, commit_iter):
+        self.prepare()
+        for commit in commit_iter:
+            if self.include(commit):
+                yield commit
+
+
+class SupersededCommitFilter(LogDedentMixin, GitMixin, PerCommitFilter):
     """
     Prunes all commits that have a note with the "Superseded-by:" header
     containing a Change-Id present in upstream tracking branch
@@ -403,6 +656,10 @@ class SupersededCommitFilter(LogDedentMixin, GitMixin, CommitFilter):
                         (optional).
     """
 
+    cost = COST_INDEX
+    commutes = True
+    parallel = True
+
     SUPERSEDE_HEADER = 'Superseded-by:'
     NOTE_REF = 'refs/notes/upstream-merge'
 
@@ -410,7 +667,13 @@ class SupersededCommitFilter(LogDedentMixin, GitMixin, CommitFilter):
 
         super(SupersededCommitFilter, self).__init__(*args, **kwargs)
 
-        if not self.is_valid_commit(search_ref):
+        # validate the search ref and limit together
+        names = [search_ref]
+        if limit and hasattr(limit, 'hexsha'):
+            names.append(limit.hexsha)
+        valid = self.valid_commits(names)
+
+        if not valid[search_ref]:
             raise ValueError("Invalid value for 'search_ref': %s" % search_ref)
         self.search_ref = search_ref
 
@@ -418,41 +681,14 @@ class SupersededCommitFilter(LogDedentMixin, GitMixin, CommitFilter):
             if not hasattr(limit, 'hexsha'):
                 raise ValueError(
                     "Invalid object: no hexsha attribute for 'limit'")
-            if not self.is_valid_commit(limit.hexsha):
+            if not valid[limit.hexsha]:
                 raise ValueError(
                     "'limit' object does not contain a valid SHA1")
         self.limit = limit
 
-        self._regex = None
-
-    def _get_rev_range(self):
-
-        if self.limit:
-            return "%s..%s" % (self.limit.hexsha, self.search_ref)
-        else:
-            return self.search_ref
-
-    def _get_change_id(self, commit):
-        """
-        Returns the Change-Id string from the footer of the given commit.
-
-        Will ignore any instances outside of the footer section
-        """
-        # read the commit message in reverse to access the
-        # footer first but ignore subject and first blank line
-        for line in reversed(commit.message.splitlines()[1:]):
-            line = line.strip()
-            # exit on the first blank line found since that indicates
-            # we're reached the top of the footer section
-            if not line:
-                break
-
-            cid = re.search('^Change-Id:\s*(.+)$', line, re.IGNORECASE)
-            if cid:
-                return cid.group(1)
-        return
+        self._index = ChangeIdIndex(search_ref, repo=self.repo)
 
-    def filter(self, commit_iter):
+    def prepare(self):
 
         self.log.info(
             """\
@@ -460,62 +696,44 @@ class SupersededCommitFilter(LogDedentMixin, GitMixin, CommitFilter):
             which is present in '%s'
             """, self.search_ref)
 
-        supersede_re = re.compile('^%s\s*(.+)\s*$' %
-                                  SupersededCommitFilter.SUPERSEDE_HEADER,
-                                  re.IGNORECASE | re.MULTILINE)
+        self._index.update()
 
-        for commit in commit_iter:
-            commit_note = commit.note(note_ref=SupersededCommitFilter.NOTE_REF)
-            # include non-annotated commits
-            if not commit_note:
-                yield commit
-                continue
+    def include(self, commit):
 
-            # include annotated commits which don't have a SUPERSEDE_HEADER
-            superseding_change_ids = supersede_re.findall(commit_note)
-            if not superseding_change_ids:
-                yield commit
-                continue
-
-            # search for all the change-ids in matches (egrep regex)
-            commits_grep_re = '^Change-Id:\\s*\(%s\)\\s*$' % \
-                              '\|'.join(superseding_change_ids)
-
-            # retrieve all matching commits because we need to check
-            # each match for whether the changeId is actually in
-            # the footer or just included as a reference.
-            matching_commits = Commit.iter_items(self.repo,
-                                                 self._get_rev_range(),
-                                                 regexp_ignore_case=True,
-                                                 grep=commits_grep_re)
-
-            for possible in matching_commits:
-                change_id = self._get_change_id(possible)
-                if change_id:
-                    superseding_change_ids.remove(change_id)
-
-            # include commits which have some superseding change-ids not
-            # present in upstream
-            if superseding_change_ids:
-                self.log.debug(
-                    """\
-                Including commit '%s %s'
-                    because the following superseding change-ids have not been
-                    found:
-                    %s
-                """, commit.hexsha[:7], commit.message.splitlines()[0],
-                    '\n    '.join(superseding_change_ids))
-                yield commit
-                continue
+        # include commits which don't have a SUPERSEDE_HEADER
+        superseding_change_ids = commit.superseded_by
+        if not superseding_change_ids:
+            return True
+
+        # look up each of the change-ids in the index of the search ref,
+        # ignoring any commits already present in the previous import
+        limit = self.limit and self.limit.hexsha
+        missing_change_ids = [
+            change_id for change_id in superseding_change_ids
+            if not self._index.contains(change_id, limit=limit)]
 
+        # include commits which have some superseding change-ids not
+        # present in upstream
+        if missing_change_ids:
             self.log.debug(
                 """\
-                Filtering out commit '%s %s'
-                    because it has been marked as superseded by the following
-                    note:
-                    %s
-                """, commit.hexsha[:7], commit.message.splitlines()[0],
-                commit_note)
+            Including commit '%s %s'
+                because the following superseding change-ids have not been
+                found:
+                %s
+            """, commit.hexsha[:7], commit.summary,
+                '\n    '.join(missing_change_ids))
+            return True
+
+        self.log.debug(
+            """\
+            Filtering out commit '%s %s'
+                because it has been marked as superseded by the following
+                change-ids:
+                %s
+            """, commit.hexsha[:7], commit.summary,
+            '\n    '.join(superseding_change_ids))
+        return False
 
 
 class DroppedCommitFilter(LogDedentMixin, CommitFilter):
@@ -523,20 +741,18 @@ class DroppedCommitFilter(LogDedentMixin, CommitFilter):
     Prunes all commits that have a note with the Dropped: header
     """
 
+    cost = COST_FREE
+    commutes = True
+
     DROPPED_HEADER = 'Dropped:'
     NOTE_REF = 'refs/notes/upstream-merge'
 
     def filter(self, commit_iter):
         for commit in commit_iter:
-            commit_note = commit.note(note_ref=DroppedCommitFilter.NOTE_REF)
-            if not commit_note:
-                yield commit
-            elif not re.match('^%s.+' % DroppedCommitFilter.DROPPED_HEADER,
-                              commit_note, re.IGNORECASE | re.MULTILINE):
+            if not commit.dropped:
                 yield commit
             else:
-                self.log.debug("Dropping commit '%s' as requested:", commit)
-                self.log.debug(commit_note)
+                self.log.debug("Dropping commit '%s' as requested", commit)
 
 
 class MergeCommitFilter(CommitFilter):
@@ -544,6 +760,9 @@ class MergeCommitFilter(CommitFilter):
     Includes only those commits that have more than one parent listed (merges)
     """
 
+    cost = COST_FREE
+    commutes = True
+
     def filter(self, commit_iter):
         for commit in commit_iter:
             if len(commit.parents) >= 2:
@@ -555,6 +774,9 @@ class NoMergeCommitFilter(CommitFilter):
     Prunes all that have more than one parent listed (merges)
     """
 
+    cost = COST_FREE
+    commutes = True
+
     def filter(self, commit_iter):
         for commit in commit_iter:
             if len(commit.parents) < 2:
@@ -567,6 +789,9 @@ class BeforeFirstParentCommitFilter(LogDedentMixin, CommitFilter):
     has a parent commit SHA1 that matches the 'stopcommit' SHA1.
     """
 
+    cost = COST_FREE
+    commutes = False
+
     def __init__(self, stopcommit, *args, **kwargs):
         self.stop = stopcommit
         super(BeforeFirstParentCommitFilter, self).__init__(*args, **kwargs)
@@ -577,13 +802,14 @@ class BeforeFirstParentCommitFilter(LogDedentMixin, CommitFilter):
             # matches the stop commit otherwise we'll also trim the commit
             # before the one we wanted to match as well.
             yield commit
-            if any(parent.hexsha == self.stop for parent in commit.parents):
+            if any(parent == self.stop for parent in commit.parents):
                 self.log.debug("Discarding all commits before '%s'",
                                commit.hexsha)
                 break
 
 
-class DiscardDuplicateGerritChangeId(LogDedentMixin, GitMixin, CommitFilter):
+class DiscardDuplicateGerritChangeId(LogDedentMixin, GitMixin,
+                                     PerCommitFilter):
     """
     Filter out commit objects where the message footer contains a ChangeId
     string that is already available in the history of commit object provided
@@ -598,11 +824,21 @@ class DiscardDuplicateGerritChangeId(LogDedentMixin, GitMixin, CommitFilter):
                         (optional).
     """
 
+    cost = COST_GIT
+    commutes = True
+    parallel = True
+
     def __init__(self, search_ref, limit=None, *args, **kwargs):
 
         super(DiscardDuplicateGerritChangeId, self).__init__(*args, **kwargs)
 
-        if not self.is_valid_commit(search_ref):
+        # validate the search ref and limit together
+        names = [search_ref]
+        if limit and hasattr(limit, 'hexsha'):
+            names.append(limit.hexsha)
+        valid = self.valid_commits(names)
+
+        if not valid[search_ref]:
             raise ValueError("Invalid value for 'search_ref': %s" % search_ref)
         self.search_ref = search_ref
 
@@ -610,46 +846,14 @@ class DiscardDuplicateGerritChangeId(LogDedentMixin, GitMixin, CommitFilter):
             if not hasattr(limit, 'hexsha'):
                 raise ValueError(
                     "Invalid object: no hexsha attribute for 'limit'")
-            if not self.is_valid_commit(limit.hexsha):
+            if not valid[limit.hexsha]:
                 raise ValueError(
                     "'limit' object does not contain a valid SHA1")
         self.limit = limit
 
-        self._regex = None
-
-    @property
-    def regex(self):
-        # compile the regex object on first usage
-        if not self._regex:
-            self._regex = re.compile("^Change-Id: ", re.I)
-        return self._regex
-
-    def _get_rev_range(self):
+        self._index = ChangeIdIndex(search_ref, repo=self.repo)
 
-        if self.limit:
-            return "%s..%s" % (self.limit.hexsha, self.search_ref)
-        else:
-            return self.search_ref
-
-    def _get_change_id(self, commit):
-        """
-        Returns the Change-Id string from the footer of the given commit.
-
-        Will ignore any instances outside of the footer section
-        """
-        # read the commit message in reverse to access the
-        # footer first but ignore subject and first blank line
-        for line in reversed(commit.message.splitlines()[1:]):
-            line = line.strip()
-            # exit on the first blank line found since that indicates
-            # we're reached the top of the footer section
-            if not line:
-                break
-            if self.regex.match(line):
-                return line
-        return
-
-    def filter(self, commit_iter):
+    def prepare(self):
 
         self.log.info(
             """\
@@ -657,53 +861,40 @@ class DiscardDuplicateGerritChangeId(LogDedentMixin, GitMixin, CommitFilter):
             found in the given search ref: %s
             """, self.search_ref)
 
-        for commit in commit_iter:
-            change_id = self._get_change_id(commit)
-            # if there is no change_id to compare against, return the commit
-            if not change_id:
-                self.log.debug(
-                    """\
-                    Including change missing 'Change-Id'
-                        Commit: %s %s
-                        Message: %s
-                    """, commit.hexsha[:7], commit.message.splitlines()[0],
-                    commit.message)
-                yield commit
-                continue
-
-            # retrieve all matching commits because we need to check
-            # each match for whether the changeId is actually in
-            # the footer or just included as a reference.
-            matching_commits = Commit.iter_items(self.repo,
-                                                 self._get_rev_range(),
-                                                 regexp_ignore_case=True,
-                                                 grep="^%s$" % change_id)
-
-            duplicate_change_id = None
-            for possible in matching_commits:
-                duplicate_change_id = self._get_change_id(possible)
-                if duplicate_change_id == change_id:
-                    break
-
-            if duplicate_change_id and duplicate_change_id == change_id:
-                self.log.debug(
-                    """\
-                    Skipping duplicate Change-Id in search ref
-                        %s
-                        Commit: %s %s
-                    """, change_id, commit.hexsha[:7],
-                    commit.message.splitlines()[0])
-                continue
+        self._index.update()
+
+    def include(self, commit):
+
+        change_id = commit.change_id
+        # if there is no change_id to compare against, return the commit
+        if not change_id:
+            self.log.debug(
+                """\
+                Including change missing 'Change-Id'
+                    Commit: %s %s
+                """, commit.hexsha[:7], commit.summary)
+            return True
 
-            # no match in the search ref, so include commit
+        # only commits after the previous import need to be considered
+        # as anything earlier will not be part of the new import
+        limit = self.limit and self.limit.hexsha
+        if self._index.contains(change_id, limit=limit):
             self.log.debug(
                 """\
-                Including unmatched change
+                Skipping duplicate Change-Id in search ref
                     %s
                     Commit: %s %s
-                """, change_id, commit.hexsha[:7],
-                commit.message.splitlines()[0])
-            yield commit
+                """, change_id, commit.hexsha[:7], commit.summary)
+            return False
+
+        # no match in the search ref, so include commit
+        self.log.debug(
+            """\
+            Including unmatched change
+                %s
+                Commit: %s %s
+            """, change_id, commit.hexsha[:7], commit.summary)
+        return True
 
 
 class TransformCommitToSHA1(CommitFilter):
@@ -711,6 +902,9 @@ class TransformCommitToSHA1(CommitFilter):
     Discard 'Commit' objects and simply return the SHA1 id's
     """
 
+    cost = COST_FREE
+    commutes = False
+
     def filter(self, commit_iter):
         for commit in commit_iter:
             yield commit.hexsha
@@ -726,6 +920,165 @@ class ReverseCommitFilter(LogDedentMixin, CommitFilter):
     filters.
     """
 
+    cost = COST_FREE
+    commutes = False
+
     def filter(self, commit_iter):
         self.log.debug("Comsuming generators to reverse commit list")
         return reversed(list(commit_iter))
+
+
+class StageStats(object):
+    """
+    Statistics for one stage of processing commits: the number of commits
+    passed in and returned, and the wall time spent and git commands run
+    within the stage itself.
+
+    Git commands are counted for the threads measuring the stage, and for
+    any work they hand to other threads through L{count_git_commands}, so
+    that commands run concurrently by other stages are not included.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.commits_in = 0
+        self.commits_out = 0
+        self.time = 0.0
+        self._counter = GitCommandCounter()
+
+    @property
+    def git_commands(self):
+        return self._counter.count
+
+    def measure(self, func, *args):
+        """
+        Call 'func' with the given arguments, adding the time spent and git
+        commands run to the stage.
+        """
+        return self._measure(1, self._counter, func, *args)
+
+    def discount(self, func, *args):
+        """
+        Call 'func' with the given arguments, removing the time spent and git
+        commands run from the stage, such as when reading commits from an
+        earlier stage.
+        """
+        return self._measure(-1, None, func, *args)
+
+    def _measure(self, sign, counter, func, *args):
+        start = time.time()
+        try:
+            return count_git_commands(counter, func, *args)
+        finally:
+            self.time += sign * (time.time() - start)
+
+    def as_dict(self):
+        return {'stage': self.name,
+                'commits_in': self.commits_in,
+                'commits_out': self.commits_out,
+                'time': self.time,
+                'git_commands': self.git_commands}
+
+
+class StatsCommitFilter(CommitFilter):
+    """
+    Wraps another CommitFilter, recording L{StageStats} for it as commits
+    are passed through.
+    """
+
+    def __init__(self, commit_filter, *args, **kwargs):
+        self.commit_filter = commit_filter
+        self.stats = StageStats(commit_filter.name)
+        super(StatsCommitFilter, self).__init__(*args, **kwargs)
+
+    @property
+    def cost(self):
+        return self.commit_filter.cost
+
+    @property
+    def commutes(self):
+        return self.commit_filter.commutes
+
+    def _count(self, commit_iter):
+        commit_iter = iter(commit_iter)
+        while True:
+            commit = self.stats.discount(next, commit_iter, None)
+            if commit is None:
+                break
+            self.stats.commits_in += 1
+            yield commit
+
+    def filter(self, commit_iter):
+        # filters returning a list rather than a generator do their work as
+        # soon as they are called, so that needs to be measured as well
+        commits = iter(self.stats.measure(self.commit_filter.filter,
+                                          self._count(commit_iter)))
+        while True:
+            commit = self.stats.measure(next, commits, None)
+            if commit is None:
+                break
+            self.stats.commits_out += 1
+            yield commit
+
+
+class ParallelCommitFilter(CommitFilter):
+    """
+    Wraps a 'parallel' PerCommitFilter, evaluating include() for several
+    commits at once using a bounded pool of threads, for filters that spend
+    most of their time waiting on git commands.
+
+    Commits are returned in the order received, with at most 'window' of
+    them awaiting a decision at any time.
+
+    :param PerCommitFilter commit_filter: filter to evaluate in parallel.
+    :param int jobs: number of threads to use.
+    """
+
+    def __init__(self, commit_filter, jobs, window=None, *args, **kwargs):
+        if not (isinstance(commit_filter, PerCommitFilter) and
+                commit_filter.parallel):
+            raise ValueError("Filter cannot be evaluated in parallel: %s" %
+                             commit_filter.__class__.__name__)
+        self.commit_filter = commit_filter
+        self.jobs = jobs
+        self.window = window or jobs * 2
+        super(ParallelCommitFilter, self).__init__(*args, **kwargs)
+
+    @property
+    def name(self):
+        return "%s (%d jobs)" % (self.commit_filter.name, self.jobs)
+
+    @property
+    def cost(self):
+        return self.commit_filter.cost
+
+    @property
+    def commutes(self):
+        return self.commit_filter.commutes
+
+    def filter(self, commit_iter):
+        self.commit_filter.prepare()
+
+        pool = ThreadPool(self.jobs)
+        pending = collections.deque()
+        try:
+            for commit in commit_iter:
+                # git commands run by the workers count towards the stage
+                # the commit was handed over from, not whichever is being
+                # measured by the time they run
+                pending.append((commit, pool.apply_async(
+                    count_git_commands,
+                    (current_git_counter(), self.commit_filter.include,
+                     commit))))
+                if len(pending) >= self.window:
+                    commit, result = pending.popleft()
+                    if result.get():
+                        yield commit
+
+            while pending:
+                commit, result = pending.popleft()
+                if result.get():
+                    yield commit
+        finally:
+            pool.terminate()
+            pool.join()
@@ -16,12 +16,19 @@
 #
 
 from git_upstream.errors import GitUpstreamError
+from git_upstream.lib.config import GitConfig
+from git_upstream.lib.gitcache import CachingGit, GitCache
 from git_upstream.lib.pygitcompat import Repo
+from git_upstream.lib.refs import RefSnapshot, common_git_dir
+from git_upstream.log import LogDedentMixin
 from git import Git
 
+
+import atexit
 import re
 import os
 import sys
+import threading
 
 try:
     from git.exc import InvalidGitRepositoryError
@@ -29,23 +36,163 @@ except ImportError:
     from git.errors import InvalidGitRepositoryError
 
 
+# sessions shared by everything using each repository, by git directory,
+# along with the paths already known to open each of them
+_sessions = {}
+_session_paths = {}
+_sessions_lock = threading.Lock()
+
+
+class RepoSession(LogDedentMixin):
+    """
+    Process wide state for a repository, shared by all L{GitMixin} objects
+    using it so that the repository is only opened once.
+
+    Besides the repository and its git command handle, the session holds
+    any long lived resources, such as caches and persistent git processes,
+    which are created on first use and shut down when the session is closed
+    or the process exits.
+
+    The git command handles of repositories attached to the session reuse
+    the results of read only queries through a shared L{GitCache}, until a
+    command is run that may change the repository.
+    """
+
+    def __init__(self, repo):
+
+        super(RepoSession, self).__init__()
+
+        self._repo = repo
+        self._resources = {}
+        self._lock = threading.RLock()
+        self._cache = GitCache(repo.git_dir, common_git_dir(repo.git_dir))
+        self.attach(repo)
+
+    @classmethod
+    def for_repo(cls, repo):
+        """
+        Return the session for the git directory of the given repository,
+        starting one with it if there is none.
+        """
+        git_dir = os.path.realpath(repo.git_dir)
+        with _sessions_lock:
+            session = _sessions.get(git_dir)
+            if session is None:
+                session = _sessions[git_dir] = cls(repo)
+        session.attach(repo)
+        return session
+
+    @classmethod
+    def for_path(cls, path):
+        """
+        Return the session for the repository at the given path, opening the
+        repository only if no session is known for the path.
+        """
+        path = os.path.realpath(path)
+        with _sessions_lock:
+            session = _session_paths.get(path)
+        if session is None:
+            session = cls.for_repo(Repo(path))
+            with _sessions_lock:
+                _session_paths[path] = session
+        return session
+
+    @property
+    def repo(self):
+        return self._repo
+
+    @property
+    def git(self):
+        return self._repo.git
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def config(self):
+        """
+        Snapshot of the git configuration of the repository.
+        """
+        return self.resource(GitConfig, lambda: GitConfig(self.git))
+
+    @property
+    def refs(self):
+        """
+        Snapshot of the references in the repository.
+        """
+        return self.resource(RefSnapshot, lambda: RefSnapshot(self.repo))
+
+    def attach(self, repo):
+        """
+        Make the git command handle of the repository share the query
+        results of the session.
+        """
+        if getattr(repo.git, 'cache', None) is not self._cache:
+            repo.git = CachingGit(repo.working_dir, cache=self._cache)
+
+    def resource(self, key, factory):
+        """
+        Return the resource stored under 'key', calling 'factory' to create
+        it if it does not exist yet.
+        """
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = factory()
+            return self._resources[key]
+
+    def close(self):
+        """
+        Close any resources held by the session that can be closed.
+        """
+        self.log.debug("Git query cache for '%s': %d hits, %d misses",
+                       self._repo.git_dir, self._cache.hits,
+                       self._cache.misses)
+        with self._lock:
+            for resource in self._resources.values():
+                if hasattr(resource, 'close'):
+                    resource.close()
+            self._resources.clear()
+
+
+@atexit.register
+def _close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+
+
 class GitMixin(object):
 
     def __init__(self, *args, **kwargs):
         repo = kwargs.pop('repo', None)
         if repo:
+            self.__session = RepoSession.for_repo(repo)
             self.__repo = repo
         else:
             try:
-                self.__repo = Repo(os.environ.get('GIT_WORK_TREE',
-                                                  os.path.curdir))
+                self.__session = RepoSession.for_path(
+                    os.environ.get('GIT_WORK_TREE', os.path.curdir))
             except InvalidGitRepositoryError:
                 exc_class, exc, tb = sys.exc_info()
                 raise GitUpstreamError("Not a git repository", tb)
+            self.__repo = self.__session.repo
 
         self.__git = self.repo.git
         super(GitMixin, self).__init__(*args, **kwargs)
 
+    @property
+    def session(self):
+        return self.__session
+
+    @property
+    def config(self):
+        return self.__session.config
+
+    @property
+    def refs(self):
+        return self.__session.refs
+
     @property
     def repo(self):
         return self.__repo
@@ -79,10 +226,69 @@ class GitMixin(object):
         This can be used to test if any name or SHA1 refers to a commit
         reachable by walking any of the refs under the .git/refs.
         """
+        return self.valid_commits([sha1])[sha1]
+
+    def valid_commits(self, names, refs=None):
+        """
+        Check which of the given names or SHA1s refer to commits reachable
+        from any of the given refs, or from any reference if none are given,
+        returning a mapping of each name to the result.
+
+        All names are resolved by a single 'git rev-parse' where they are
+        valid, and checked at once with 'git rev-list', which only walks the
+        history until each commit is known to be reachable or not, rather
+        than from every ref as 'git name-rev' does.
+        """
+        names = list(names)
+        results = dict((name, False) for name in names)
+        if not names:
+            return results
 
-        # get_name will return a string if the sha1 is reachable from an
-        # existing reference.
-        return bool(self.get_name(sha1))
+        peeled = ["%s^{commit}" % name for name in names]
+        sha1s = self.git.rev_parse(*peeled,
+                                   with_exceptions=False).splitlines()
+        # resolve each name on its own if any of them is not valid
+        if len(sha1s) != len(names):
+            sha1s = [self.git.rev_parse(name, verify=True, q=True,
+                                        with_exceptions=False)
+                     for name in peeled]
+        resolved = dict((name, sha1) for name, sha1 in zip(names, sha1s)
+                        if sha1)
+        if not resolved:
+            return results
+
+        # list the commits not reachable from the refs, stopping once all
+        # of those to check have been seen
+        wanted = set(resolved.values())
+        rev_list_args = sorted(wanted) + ["--not"] + (refs or ["--all"])
+        proc = self.git.rev_list(*rev_list_args, as_process=True)
+        unreachable = set()
+        for line in proc.stdout:
+            sha1 = line.strip()
+            if sha1 in wanted:
+                unreachable.add(sha1)
+                if len(unreachable) == len(wanted):
+                    proc.proc.kill()
+                    proc.proc.wait()
+                    break
+        else:
+            proc.wait()
+
+        for name, sha1 in resolved.items():
+            results[name] = sha1 not in unreachable
+        return results
+
+    def is_ancestor(self, ancestor, commit):
+        """
+        Check if the commit 'ancestor' is reachable from 'commit'.
+
+        Uses 'git merge-base' rather than the '--is-ancestor' option to retain
+        support for versions of git older than 1.8.0.
+        """
+        base = self.git.merge_base(ancestor, commit, with_exceptions=False)
+        if not base:
+            return False
+        return base == self.git.rev_parse(ancestor)
 
 
 def check_git_version(major, minor, revision):
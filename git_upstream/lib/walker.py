@@ -0,0 +1,284 @@
+#
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from git_upstream.lib.catfile import ObjectReader, PIPELINE_DEPTH
+from git_upstream.lib.note import Note
+from git_upstream.lib.utils import GitMixin, check_git_version
+from git_upstream.log import LogDedentMixin
+from gitdb.util import bin_to_hex, hex_to_bin
+
+import re
+
+# fields requested from git for each commit, each terminated by a NUL so that
+# subjects and multi-line notes/messages can be split reliably. The final
+# field is either the full message or just the Change-Id trailer values.
+WALK_FORMAT = "%H%x00%P%x00%s%x00%N%x00{0}%x00"
+WALK_FIELDS = 5
+
+MESSAGE_PROJECTION = "%B"
+TRAILERS_PROJECTION = "%(trailers:key=Change-Id,valueonly)"
+
+READ_SIZE = 64 * 1024
+
+CHANGE_ID_RE = re.compile('^Change-Id:\s*(.+?)\s*$', re.IGNORECASE)
+
+_trailers_supported = None
+
+
+def get_change_id(message):
+    """
+    Returns the Change-Id string from the footer of the given commit message.
+
+    Will ignore any instances outside of the footer section
+    """
+    # read the commit message in reverse to access the
+    # footer first but ignore subject and first blank line
+    for line in reversed(message.splitlines()[1:]):
+        line = line.strip()
+        # exit on the first blank line found since that indicates
+        # we're reached the top of the footer section
+        if not line:
+            break
+
+        cid = CHANGE_ID_RE.match(line)
+        if cid:
+            return cid.group(1)
+    return None
+
+
+def trailers_supported():
+    """
+    Check if git supports selecting trailers by key in format strings, which
+    was added in git 2.22.0.
+    """
+    global _trailers_supported
+    if _trailers_supported is None:
+        _trailers_supported = check_git_version(2, 22, 0)
+    return _trailers_supported
+
+
+class CommitTable(object):
+    """
+    Table of binary SHA1s shared by all commits from a walk, allowing each
+    commit to refer to its parents by index so that every SHA1 is only held
+    in memory once.
+    """
+
+    __slots__ = ('_binshas', '_ids')
+
+    def __init__(self):
+        self._binshas = []
+        self._ids = {}
+
+    def add(self, binsha):
+        """Return the index of the binary SHA1, adding it if not present."""
+        idx = self._ids.get(binsha)
+        if idx is None:
+            idx = self._ids[binsha] = len(self._binshas)
+            self._binshas.append(binsha)
+        return idx
+
+    def __getitem__(self, idx):
+        return self._binshas[idx]
+
+    def __len__(self):
+        return len(self._binshas)
+
+
+class WalkedCommit(object):
+    """
+    Commit information retrieved by L{CommitWalker}, containing everything
+    needed by the commit filters without requiring any further git calls.
+
+    Only the binary SHA1, parent indices into the L{CommitTable} of the walk,
+    subject, Change-Id and the note headers used for marking commits are
+    retained, keeping the memory used per commit small and constant.
+    """
+
+    __slots__ = ('_table', 'binsha', 'parent_ids', 'summary', 'change_id',
+                 'dropped', 'superseded_by')
+
+    def __init__(self, table, binsha, parent_ids, summary, change_id=None,
+                 dropped=False, superseded_by=()):
+        self._table = table
+        self.binsha = binsha
+        self.parent_ids = parent_ids
+        self.summary = summary
+        self.change_id = change_id
+        self.dropped = dropped
+        self.superseded_by = superseded_by
+
+    @property
+    def hexsha(self):
+        """Hex SHA1 of the commit."""
+        return bin_to_hex(self.binsha)
+
+    @property
+    def parent_binshas(self):
+        """Tuple of the binary SHA1s of the parents of the commit."""
+        return tuple(self._table[idx] for idx in self.parent_ids)
+
+    @property
+    def parents(self):
+        """Tuple of the hex SHA1s of the parents of the commit."""
+        return tuple(bin_to_hex(self._table[idx]) for idx in self.parent_ids)
+
+    def __str__(self):
+        return self.hexsha
+
+    def __repr__(self):
+        return '<%s "%s">' % (self.__class__.__name__, self.hexsha)
+
+
+class CommitWalker(LogDedentMixin, GitMixin):
+    """
+    Walk commits using a single 'git log' process, parsing the SHA1,
+    parents, subject, Change-Id footer and note of each commit from one
+    output stream.
+
+    Where git supports it, only the values of the Change-Id trailers are
+    requested instead of the full commit message, so that large message
+    bodies are never transferred or decoded. Git only reports trailers when
+    the final paragraph of the message follows its trailer rules, so the
+    messages of commits without any are read through the shared
+    L{ObjectReader} instead, in batches, and searched as get_change_id()
+    does.
+
+    :param string note_ref: notes ref to include note contents from, or None
+                            to skip reading notes.
+    :param bool trailers: whether to project only the Change-Id trailers,
+                          defaults to doing so if supported by git.
+    """
+
+    NOTE_REF = 'refs/notes/upstream-merge'
+
+    def __init__(self, note_ref=NOTE_REF, trailers=None, *args, **kwargs):
+
+        self._note_ref = note_ref
+        if trailers is None:
+            trailers = trailers_supported()
+        self._trailers = trailers
+
+        super(CommitWalker, self).__init__(*args, **kwargs)
+
+    @property
+    def note_ref(self):
+        """Notes ref to include note contents from."""
+        return self._note_ref
+
+    @property
+    def trailers(self):
+        """Whether only the Change-Id trailers are requested from git."""
+        return self._trailers
+
+    def _change_id(self, projection):
+        """
+        Returns the Change-Id from the projected message field, taking the
+        last one listed in the footer as get_change_id() does.
+        """
+        if not self.trailers:
+            return get_change_id(projection)
+
+        trailers = projection.strip().splitlines()
+        if trailers:
+            return trailers[-1].strip()
+        return None
+
+    def _iter_fields(self, stream):
+        """
+        Generator returning lists of fields for each commit read from the
+        NUL separated output stream.
+        """
+        pending = ''
+        fields = []
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            chunks = (pending + data).split('\x00')
+            pending = chunks.pop()
+            for chunk in chunks:
+                fields.append(chunk)
+                if len(fields) == WALK_FIELDS:
+                    yield fields
+                    fields = []
+
+    def walk(self, *revs, **kwargs):
+        """
+        Generator returning a L{WalkedCommit} for each commit listed by 'git
+        log' for the given revisions. Additional keyword arguments are passed
+        as options to 'git log'.
+        """
+        log_args = ['--no-color', '--no-notes']
+        if self.note_ref:
+            log_args.append('--notes=%s' % self.note_ref)
+        log_args.extend(revs)
+
+        if self.trailers:
+            log_format = WALK_FORMAT.format(TRAILERS_PROJECTION)
+        else:
+            log_format = WALK_FORMAT.format(MESSAGE_PROJECTION)
+
+        proc = self.git.log(*log_args, format=log_format, as_process=True,
+                            **kwargs)
+
+        table = CommitTable()
+        batch = []
+        for hexsha, parents, summary, note, projection in \
+                self._iter_fields(proc.stdout):
+            # records after the first are preceded by the newline git
+            # uses to separate each formatted commit
+            binsha = table[table.add(hex_to_bin(hexsha.lstrip()))]
+            parent_ids = tuple(table.add(hex_to_bin(parent))
+                               for parent in parents.split())
+
+            commit = WalkedCommit(table, binsha, parent_ids, summary,
+                                  change_id=self._change_id(projection))
+            if note.strip():
+                note = Note(note)
+                commit.dropped = bool(note.dropped)
+                commit.superseded_by = tuple(note.superseded_by)
+            batch.append(commit)
+
+            if len(batch) >= PIPELINE_DEPTH:
+                for walked in self._complete(batch):
+                    yield walked
+                batch = []
+
+        for walked in self._complete(batch):
+            yield walked
+
+        proc.wait()
+
+    def _complete(self, commits):
+        """
+        Returns the given commits after reading the Change-Ids of any whose
+        footer git did not recognise as trailers from their full messages.
+        """
+        if not self.trailers:
+            return commits
+
+        missing = [commit for commit in commits if commit.change_id is None]
+        if missing:
+            reader = ObjectReader.for_repo(self.repo)
+            infos = reader.read_many([commit.hexsha for commit in missing])
+            for commit, info in zip(missing, infos):
+                if info:
+                    # the message follows the first blank line of the object
+                    commit.change_id = get_change_id(
+                        info.data.partition('\n\n')[2])
+        return commits
@@ -0,0 +1,73 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the catfile module"""
+
+from git_upstream.lib import catfile as cf
+from git_upstream.tests import base
+from git import repo as r
+
+
+class TestObjectReader(base.BaseTestCase):
+    """Test case for ObjectReader class"""
+
+    def test_read(self):
+        """Test object contents are read"""
+
+        repo = r.Repo('.')
+        reader = cf.ObjectReader(repo=repo)
+        self.addCleanup(reader.close)
+
+        commit = reader.read("HEAD")
+        self.assertEquals(repo.git.rev_parse("HEAD"), commit.hexsha)
+        self.assertEquals("commit", commit.type)
+        self.assertEquals(repo.odb.stream(repo.head.commit.binsha).read(),
+                          commit.data)
+        self.assertEquals(len(commit.data), commit.size)
+
+    def test_info(self):
+        """Test names are resolved and missing objects reported"""
+
+        repo = r.Repo('.')
+        reader = cf.ObjectReader(repo=repo)
+        self.addCleanup(reader.close)
+
+        self.assertEquals(repo.git.rev_parse("HEAD^{tree}"),
+                          reader.resolve("HEAD^{tree}"))
+        self.assertEquals("tree", reader.info("HEAD^{tree}").type)
+        self.assertEquals(None, reader.info("does-not-exist"))
+        self.assertEquals(None, reader.read("does-not-exist"))
+
+    def test_many(self):
+        """Test more requests than are pipelined at once"""
+
+        repo = r.Repo('.')
+        reader = cf.ObjectReader(repo=repo)
+        self.addCleanup(reader.close)
+
+        names = ["HEAD", "HEAD~1"] * (cf.PIPELINE_DEPTH + 1)
+        shas = [repo.git.rev_parse(name) for name in names[:2]] * \
+            (cf.PIPELINE_DEPTH + 1)
+        self.assertEquals(shas, [info.hexsha
+                                 for info in reader.read_many(names)])
+        self.assertEquals(shas, [info.hexsha
+                                 for info in reader.info_many(names)])
+
+    def test_for_repo(self):
+        """Test readers are shared by repository"""
+
+        repo = r.Repo('.')
+        self.assertIs(cf.ObjectReader.for_repo(repo),
+                      cf.ObjectReader.for_repo(r.Repo('.')))
@@ -0,0 +1,80 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the changeid module"""
+
+from git_upstream.lib import changeid as c
+from git_upstream.tests import base
+from git import repo as r
+
+import os
+
+
+class TestChangeIdIndex(base.BaseTestCase):
+    """Test case for ChangeIdIndex class"""
+
+    def _commit(self, repo, change_id):
+        repo.git.commit(allow_empty=True,
+                        m="Change %s\n\nChange-Id: %s" % (change_id,
+                                                          change_id))
+        return repo.git.rev_parse("HEAD")
+
+    def test_lookup(self):
+        """Test Change-Ids are found in the reference history"""
+
+        repo = r.Repo('.')
+        first = self._commit(repo, "I0000000000000000000000000000000000000001")
+        index = c.ChangeIdIndex("HEAD", repo=repo)
+
+        self.assertEquals(
+            [first],
+            index.lookup("I0000000000000000000000000000000000000001"))
+        self.assertNotIn("I0000000000000000000000000000000000000002", index)
+        self.assertTrue(os.path.exists(index._path))
+
+    def test_incremental_update(self):
+        """Test index only parses commits added since the last update"""
+
+        repo = r.Repo('.')
+        first = self._commit(repo, "I0000000000000000000000000000000000000001")
+        index = c.ChangeIdIndex("HEAD", repo=repo)
+        self.assertEquals(first, index.tip)
+
+        second = self._commit(repo,
+                              "I0000000000000000000000000000000000000002")
+        index = c.ChangeIdIndex("HEAD", repo=repo)
+        index.update()
+
+        self.assertEquals(second, index.tip)
+        self.assertIn("I0000000000000000000000000000000000000001", index)
+        self.assertIn("I0000000000000000000000000000000000000002", index)
+        self.assertFalse(
+            index.contains("I0000000000000000000000000000000000000001",
+                           limit=first))
+        self.assertTrue(
+            index.contains("I0000000000000000000000000000000000000002",
+                           limit=first))
+
+    def test_multi_word_change_id(self):
+        """Test Change-Id values containing whitespace are reloaded"""
+
+        repo = r.Repo('.')
+        first = self._commit(repo, "I1234 extra words")
+        c.ChangeIdIndex("HEAD", repo=repo).update()
+
+        index = c.ChangeIdIndex("HEAD", repo=repo)
+        index.update()
+
+        self.assertEquals([first], index.lookup("I1234 extra words"))
@@ -0,0 +1,92 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests the commitgraph module"""
+
+from git_upstream.lib import commitgraph as cg
+from git_upstream.tests import base
+
+from git import repo as r
+
+import os
+
+
+class TestCommitGraphFile(base.BaseTestCase):
+    """Test case for CommitGraphFile class"""
+
+    def setUp(self):
+        super(TestCommitGraphFile, self).setUp()
+
+        self.repo = r.Repo('.')
+        self.objects = os.path.join(self.repo.git_dir, 'objects')
+        git = self.repo.git
+        self.root = git.rev_parse("HEAD")
+        git.commit(allow_empty=True, m="left")
+        self.left = git.rev_parse("HEAD")
+        git.checkout(self.root, b="right")
+        git.commit(allow_empty=True, m="right")
+        self.right = git.rev_parse("HEAD")
+        git.merge(self.left, no_ff=True, m="merge")
+        self.merge = git.rev_parse("HEAD")
+
+    def _write(self, *args):
+        self.repo.git.commit_graph("write", "--reachable", *args)
+        graph = cg.CommitGraphFile.open(self.objects)
+        self.addCleanup(graph.close)
+        return graph
+
+    def test_missing(self):
+        """Test there is no reader without a commit-graph file"""
+
+        self.assertIsNone(cg.CommitGraphFile.open(self.objects))
+
+    def test_read(self):
+        """Test parents are read from the file"""
+
+        graph = self._write()
+
+        self.assertEquals(len(self.repo.git.rev_list("--all").split()),
+                          len(graph))
+        self.assertEquals([self.right, self.left], graph.parents(self.merge))
+
+    def test_split(self):
+        """Test commits are found across the layers of a split graph"""
+
+        self.repo.git.commit_graph("write", "--reachable", "--split")
+        self.repo.git.commit(allow_empty=True, m="after")
+        after = self.repo.git.rev_parse("HEAD")
+        graph = self._write("--split=no-merge")
+
+        self.assertIn(self.root, graph)
+        self.assertEquals([self.merge], graph.parents(after))
+
+    def test_queries(self):
+        """Test graph queries match the answers from git"""
+
+        graph = self._write()
+
+        self.assertEquals(
+            self.repo.git.merge_base(self.left, self.right).split(),
+            graph.merge_bases(self.left, self.right))
+        self.assertEquals([self.merge],
+                          graph.independent([self.merge, self.left,
+                                             self.root]))
+
+    def test_new_commits(self):
+        """Test commits made after writing the file are not found"""
+
+        graph = self._write()
+        self.repo.git.commit(allow_empty=True, m="after")
+
+        self.assertNotIn(self.repo.git.rev_parse("HEAD"), graph)
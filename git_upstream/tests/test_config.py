@@ -0,0 +1,72 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests the config module"""
+
+from git_upstream.lib import config as c
+from git_upstream.lib import gitcache as gc
+from git_upstream.tests import base
+
+import os
+
+
+class TestGitConfig(base.BaseTestCase):
+    """Test case for GitConfig class"""
+
+    def _config(self, *settings):
+        git = gc.CachingGit(os.getcwd())
+        for name, value in settings:
+            git.config(name, value, add=True)
+        return c.GitConfig(git)
+
+    def test_get(self):
+        """Test the last of multiple values takes effect"""
+
+        config = self._config(("upstream.Multi", "first"),
+                              ("upstream.multi", "second"))
+
+        self.assertEquals("second", config.get("UPSTREAM.multi"))
+        self.assertEquals(["first", "second"],
+                          config.get_all("upstream.multi"))
+        self.assertEquals("default", config.get("upstream.none", "default"))
+
+    def test_typed(self):
+        """Test values are converted to booleans and integers as git does"""
+
+        config = self._config(("upstream.flag", "yes"),
+                              ("upstream.size", "2k"))
+
+        self.assertTrue(config.get_bool("upstream.flag"))
+        self.assertFalse(config.get_bool("upstream.none"))
+        self.assertEquals(2048, config.get_int("upstream.size"))
+        self.assertRaises(ValueError, config.get_int, "upstream.flag")
+
+    def test_section(self):
+        """Test the git-upstream settings are read together"""
+
+        config = self._config(("upstream.jobs", "4"),
+                              ("branch.Topic.merge", "refs/heads/topic"))
+
+        self.assertEquals({"jobs": "4"}, config.section())
+        self.assertEquals({"merge": "refs/heads/topic"},
+                          config.section("BRANCH.Topic"))
+
+    def test_reload(self):
+        """Test the snapshot is read again after a change through git"""
+
+        config = self._config()
+        self.assertNotIn("upstream.jobs", config)
+        config._git.config("upstream.jobs", "2")
+
+        self.assertEquals(2, config.get_int("upstream.jobs"))
@@ -0,0 +1,85 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the gitcache module"""
+
+from git_upstream.lib import gitcache as gc
+from git_upstream.tests import base
+from git import Git
+
+import os
+import threading
+
+
+class TestCachingGit(base.BaseTestCase):
+    """Test case for CachingGit class"""
+
+    def test_query(self):
+        """Test query results are reused"""
+
+        git = gc.CachingGit(os.getcwd())
+        head = git.rev_parse("HEAD")
+
+        self.assertEquals(head, git.rev_parse("HEAD"))
+        self.assertEquals(1, git.cache.hits)
+        self.assertEquals(1, git.cache.misses)
+
+    def test_invalidate(self):
+        """Test changes made through git discard previous results"""
+
+        git = gc.CachingGit(os.getcwd())
+        head = git.rev_parse("HEAD")
+        git.commit(allow_empty=True, m="New commit")
+
+        self.assertNotEquals(head, git.rev_parse("HEAD"))
+        self.assertEquals(0, git.cache.hits)
+
+    def test_external_change(self):
+        """Test changes made through another handle discard results"""
+
+        git = gc.CachingGit(os.getcwd(), cache=gc.GitCache(
+            os.path.join(os.getcwd(), '.git')))
+        head = git.rev_parse("HEAD")
+        Git(os.getcwd()).commit(allow_empty=True, m="New commit")
+
+        self.assertNotEquals(head, git.rev_parse("HEAD"))
+        self.assertEquals(0, git.cache.hits)
+
+    def test_getter(self):
+        """Test settings are cached when read but not when written"""
+
+        git = gc.CachingGit(os.getcwd())
+        self.assertEquals("", git.config("upstream.test",
+                                         with_exceptions=False))
+        git.config("upstream.test", "value")
+
+        self.assertEquals("value", git.config("upstream.test",
+                                              with_exceptions=False))
+        self.assertEquals(0, git.cache.hits)
+
+    def test_count_commands(self):
+        """Test commands are only counted for the thread counting them"""
+
+        git = gc.CachingGit(os.getcwd())
+        counter = gc.GitCommandCounter()
+        other = threading.Thread(target=git.rev_parse, args=("HEAD^{tree}",))
+
+        gc.count_git_commands(counter, git.rev_parse, "HEAD")
+        gc.count_git_commands(counter, git.rev_parse, "HEAD")
+        other.start()
+        other.join()
+
+        self.assertEquals(1, counter.count)
+        self.assertIsNone(gc.current_git_counter())
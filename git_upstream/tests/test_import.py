@@ -0,0 +1,79 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the import command module"""
+
+from git_upstream.lib import searchers as s
+from git_upstream.tests import base
+from git import repo as r
+
+import importlib
+import multiprocessing
+
+i = importlib.import_module('git_upstream.commands.import')
+
+
+class TestLocateChangesStrategy(base.BaseTestCase):
+    """Test case for LocateChangesStrategy class"""
+
+    def test_plan_filters(self):
+        """Test cheaper filters are run first without crossing barriers"""
+
+        dropped = s.DroppedCommitFilter()
+        no_merge = s.NoMergeCommitFilter()
+        reverse = s.ReverseCommitFilter()
+        merge = s.MergeCommitFilter()
+        to_sha1 = s.TransformCommitToSHA1()
+
+        strategy = i.LocateChangesWalk()
+        strategy.filters = [merge, dropped, no_merge, reverse, to_sha1]
+        # a commuting filter that may run git for each commit
+        expensive = s.NoMergeCommitFilter()
+        expensive.cost = s.COST_GIT
+        strategy.filters.insert(0, expensive)
+
+        self.assertEquals([merge, dropped, no_merge, expensive, reverse,
+                           to_sha1], strategy.plan_filters())
+
+    def test_jobs(self):
+        """Test jobs are read from git config, 0 using one per CPU"""
+
+        r.Repo('.').git.config("upstream.jobs", "0")
+        strategy = i.LocateChangesWalk()
+
+        self.assertEquals(multiprocessing.cpu_count(), strategy.jobs)
+        self.assertEquals(strategy.jobs, strategy.searcher.jobs)
+
+
+class TestImportUpstream(base.BaseTestCase):
+    """Test case for ImportUpstream class"""
+
+    def test_is_up_to_date(self):
+        """Test importing is only needed once upstream has moved on"""
+
+        git = r.Repo('.').git
+        branch = git.rev_parse("HEAD", abbrev_ref=True)
+        git.branch("upstream/master")
+        git.commit(allow_empty=True, m="Local change")
+
+        import_upstream = i.ImportUpstream(branch=branch,
+                                           upstream="upstream/master",
+                                           extra_branches=[])
+        self.assertTrue(import_upstream.is_up_to_date())
+
+        git.checkout("upstream/master")
+        git.commit(allow_empty=True, m="Upstream change")
+        git.checkout(branch)
+        self.assertFalse(import_upstream.is_up_to_date())
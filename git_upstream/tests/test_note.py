@@ -0,0 +1,71 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the note module"""
+
+from git_upstream.lib import note as n
+from git_upstream.tests import base
+from git import repo as r
+
+import testtools
+
+
+class TestNote(testtools.TestCase):
+    """Test case for Note class"""
+
+    def test_headers(self):
+        """Test parsing of the note headers"""
+
+        note = n.Note("Superseded-by: I1234567\n"
+                      "Dropped: Walter White <heisenberg@hp.com>\n"
+                      "superseded-by: I7654321 \n")
+        self.assertEquals(["Walter White <heisenberg@hp.com>"], note.dropped)
+        self.assertEquals(["I1234567", "I7654321"], note.superseded_by)
+
+    def test_no_headers(self):
+        """Test parsing of a note without headers"""
+
+        note = n.Note("Some note\n")
+        self.assertEquals([], note.dropped)
+        self.assertEquals([], note.superseded_by)
+
+
+class TestNotesMap(base.BaseTestCase):
+    """Test case for NotesMap class"""
+
+    note_ref = 'refs/notes/upstream-merge'
+
+    def test_get(self):
+        """Test retrieving notes for annotated and plain commits"""
+
+        repo = r.Repo('.')
+        head = repo.git.rev_parse("HEAD")
+        parent = repo.git.rev_parse("HEAD~1")
+        repo.git.notes('--ref', TestNotesMap.note_ref, 'add', '-f', '-m',
+                       'Dropped: Walter White <heisenberg@hp.com>', head)
+
+        notes = n.NotesMap(TestNotesMap.note_ref, repo=repo)
+
+        self.assertIn(head, notes)
+        self.assertEquals(["Walter White <heisenberg@hp.com>"],
+                          notes.get(head).dropped)
+        self.assertNotIn(parent, notes)
+        self.assertEquals(None, notes.get(parent))
+
+    def test_missing_ref(self):
+        """Test a notes ref that does not exist yields an empty map"""
+
+        notes = n.NotesMap('refs/notes/does-not-exist', repo=r.Repo('.'))
+        self.assertEquals({}, notes.blobs)
@@ -0,0 +1,99 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests the reachability module"""
+
+from git_upstream.lib import reachability as rc
+from git_upstream.tests import base
+from git import repo as r
+
+import os
+import struct
+
+
+class TestReachabilityIndex(base.BaseTestCase):
+    """Test case for ReachabilityIndex class"""
+
+    def setUp(self):
+        super(TestReachabilityIndex, self).setUp()
+
+        self.repo = r.Repo('.')
+        git = self.repo.git
+        self.root = git.rev_parse("HEAD")
+        git.checkout(b="upstream")
+        git.commit(allow_empty=True, m="left")
+        self.left = git.rev_parse("HEAD")
+        git.checkout(self.root, b="right")
+        git.commit(allow_empty=True, m="right")
+        self.right = git.rev_parse("HEAD")
+        git.checkout("upstream")
+        git.merge("right", no_ff=True, m="merge")
+        self.merge = git.rev_parse("HEAD")
+
+    def test_reachable(self):
+        """Test ancestry is answered for commits in the history"""
+
+        index = rc.ReachabilityIndex("upstream", repo=self.repo)
+
+        self.assertEquals(len(self.repo.git.rev_list("upstream").split()),
+                          len(index))
+        self.assertTrue(index.is_reachable(self.root, self.merge))
+        self.assertTrue(index.is_reachable(self.right, self.merge))
+        self.assertFalse(index.is_reachable(self.left, self.right))
+        self.assertFalse(index.is_reachable(self.merge, self.left))
+        self.assertTrue(os.path.exists(index._bitmaps_path))
+
+    def test_incremental_update(self):
+        """Test numbering and bitmaps are kept as the reference advances"""
+
+        index = rc.ReachabilityIndex("upstream", repo=self.repo)
+        self.assertTrue(index.is_reachable(self.root, self.left))
+        numbers = dict((sha1, index._node(sha1))
+                       for sha1 in (self.root, self.left, self.merge))
+
+        self.repo.git.commit(allow_empty=True, m="after")
+        after = self.repo.git.rev_parse("HEAD")
+        index = rc.ReachabilityIndex("upstream", repo=self.repo)
+        index.update()
+
+        self.assertEquals(after, index.tip)
+        self.assertEquals(numbers, dict((sha1, index._node(sha1))
+                                        for sha1 in numbers))
+        self.assertIn(index._node(self.root), index.reachable(self.left))
+        self.assertTrue(index.is_reachable(self.right, after))
+
+    def test_rewritten(self):
+        """Test the index is rebuilt when the reference is rewound"""
+
+        index = rc.ReachabilityIndex("upstream", repo=self.repo)
+        index.update()
+        self.repo.git.reset(self.right, hard=True)
+        index.update()
+
+        self.assertNotIn(self.left, index)
+        self.assertTrue(index.is_reachable(self.root, self.right))
+
+    def test_fixed_width_entries(self):
+        """Test offsets and parents are stored as 32-bit values"""
+
+        index = rc.ReachabilityIndex("upstream", repo=self.repo)
+        index.update()
+        count = len(index)
+        parents = len(self.repo.git.rev_list(
+            "upstream", parents=True).split()) - count
+
+        header = struct.calcsize(rc.INDEX_HEADER)
+        expected = header + count * 20 + (count + 1 + parents) * 4
+
+        self.assertEquals(expected, os.path.getsize(index._path))
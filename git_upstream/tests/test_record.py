@@ -0,0 +1,73 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests the record module"""
+
+from git_upstream.lib import record as rd
+from git_upstream.tests import base
+from git import repo as r
+
+
+class TestImportRecord(base.BaseTestCase):
+    """Test case for ImportRecord class"""
+
+    def setUp(self):
+        super(TestImportRecord, self).setUp()
+
+        self.repo = r.Repo('.')
+        git = self.repo.git
+        self.branch = git.rev_parse("HEAD", abbrev_ref=True)
+        git.branch("upstream/master")
+        git.checkout("upstream/master")
+        git.commit(allow_empty=True, m="Upstream change")
+        self.import_point = git.rev_parse("HEAD")
+        git.checkout(self.branch)
+        git.merge("upstream/master", no_ff=True, m="Import upstream")
+
+        self.record = rd.ImportRecord(self.branch, repo=self.repo)
+        self.record.write(self.import_point, "upstream/master")
+
+    def test_read(self):
+        """Test the details written are read back"""
+
+        record = self.record.read()
+
+        self.assertEquals("refs/upstream-imports/" + self.branch,
+                          self.record.ref)
+        self.assertEquals(self.repo.git.rev_parse("HEAD"), record['tip'])
+        self.assertEquals(self.import_point, record['import_point'])
+        self.assertEquals("upstream/master", record['upstream'])
+        self.assertEquals(self.import_point, record['upstream_tip'])
+
+    def test_find(self):
+        """Test the import point is used while the branch only moves on"""
+
+        self.repo.git.commit(allow_empty=True, m="Local change")
+        self.repo.git.checkout("upstream/master")
+        self.repo.git.commit(allow_empty=True, m="Later upstream change")
+        self.repo.git.checkout(self.branch)
+
+        self.assertEquals(self.import_point,
+                          self.record.find("upstream/master"))
+        self.assertIsNone(self.record.find("upstream/*"))
+
+    def test_stale(self):
+        """Test the record is not used once upstream is merged again"""
+
+        self.repo.git.checkout("upstream/master")
+        self.repo.git.commit(allow_empty=True, m="Later upstream change")
+        self.repo.git.checkout(self.branch)
+        self.repo.git.merge("upstream/master", no_ff=True, m="Merge again")
+
+        self.assertIsNone(self.record.find("upstream/master"))
@@ -0,0 +1,84 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests the refs module"""
+
+from git_upstream.lib import gitcache as gc
+from git_upstream.lib import refs as rf
+from git_upstream.tests import base
+
+from git import repo as r
+
+
+class TestRefSnapshot(base.BaseTestCase):
+    """Test case for RefSnapshot class"""
+
+    def _refs(self, *names):
+        repo = r.Repo('.')
+        repo.git = gc.CachingGit(repo.working_dir)
+        for name in names:
+            repo.git.update_ref(name, "HEAD")
+        return rf.RefSnapshot(repo)
+
+    def _for_each_ref(self, refs, *patterns):
+        return refs._repo.git.for_each_ref(
+            *patterns, format="%(refname) %(objectname)").splitlines()
+
+    def test_match(self):
+        """Test patterns select the same references as git"""
+
+        refs = self._refs("refs/heads/upstream/master",
+                          "refs/remotes/origin/upstream/master",
+                          "refs/remotes/origin/other/upstream/area")
+        patterns = ["refs/heads/upstream/*", "refs/remotes/*/upstream/*"]
+
+        self.assertEquals(self._for_each_ref(refs, *patterns),
+                          ["%s %s" % (name, refs.get(name))
+                           for name in refs.match(*patterns)])
+        self.assertEquals(["refs/heads/upstream/master"],
+                          refs.match("refs/heads/upstream"))
+
+    def test_packed(self):
+        """Test packed references are read, with loose ones preferred"""
+
+        refs = self._refs("refs/tags/packed", "refs/heads/loose")
+        refs._repo.git.pack_refs(all=True)
+        refs._repo.git.update_ref("refs/heads/loose", "HEAD~1")
+
+        self.assertEquals(self._for_each_ref(refs, "refs"),
+                          ["%s %s" % (name, refs.get(name))
+                           for name in refs.match("refs")])
+        self.assertIn("refs/tags/packed", refs)
+
+    def test_shorten(self):
+        """Test names are shortened as git does"""
+
+        refs = self._refs("refs/tags/master",
+                          "refs/remotes/origin/upstream/master")
+
+        self.assertEquals("heads/master", refs.shorten("refs/heads/master"))
+        self.assertEquals("tags/master", refs.shorten("refs/tags/master"))
+        self.assertEquals("master", refs.shorten("refs/tags/master",
+                                                 strict=False))
+        self.assertEquals("origin/upstream/master",
+                          refs.shorten("refs/remotes/origin/upstream/master"))
+
+    def test_show(self):
+        """Test trailing components are matched as by 'git show-ref'"""
+
+        refs = self._refs("refs/heads/upstream/master", "refs/tags/master")
+
+        self.assertEquals(["refs/heads/master", "refs/heads/upstream/master"],
+                          refs.show("master", heads=True))
+        self.assertEquals([], refs.show("ster", heads=True))
@@ -0,0 +1,53 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the runner module"""
+
+from git_upstream.lib import runner as rn
+from git_upstream.tests import base
+from git import repo as r
+from git import GitCommandError
+
+
+class TestGitRunner(base.BaseTestCase):
+    """Test case for GitRunner class"""
+
+    def test_map(self):
+        """Test results are returned in the order the commands were given"""
+
+        repo = r.Repo('.')
+        revs = ["HEAD", "HEAD~1", "HEAD~2", "HEAD"]
+        runner = rn.GitRunner(limit=2, repo=repo)
+
+        self.assertEquals([repo.git.rev_parse(rev) for rev in revs],
+                          runner.map('rev_parse', [(rev,) for rev in revs]))
+
+    def test_gather(self):
+        """Test different commands can be run together"""
+
+        repo = r.Repo('.')
+        runner = rn.GitRunner(repo=repo)
+
+        sha1, names = runner.gather(('rev_parse', ("HEAD",), {}),
+                                    ('show_ref', (), {'heads': True}))
+        self.assertEquals(repo.git.rev_parse("HEAD"), sha1)
+        self.assertEquals(repo.git.show_ref(heads=True), names)
+
+    def test_error(self):
+        """Test exceptions from any command are raised"""
+
+        runner = rn.GitRunner(repo=r.Repo('.'))
+        self.assertRaises(GitCommandError, runner.map, 'rev_parse',
+                          [("HEAD",), ("does-not-exist",)], verify=True)
@@ -0,0 +1,179 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the searchers module"""
+
+from git_upstream.lib import record as rd
+from git_upstream.lib import searchers as s
+from git_upstream.lib import utils
+from git_upstream.tests import base
+from git import repo as r
+
+import collections
+import testtools
+
+
+class TestUpstreamMergeBaseSearcher(base.BaseTestCase):
+    """Test case for UpstreamMergeBaseSearcher class"""
+
+    def _import(self, repo):
+        """
+        Create an upstream branch that has been merged into the current
+        branch, with locally carried changes either side of the merge.
+        """
+        repo.git.branch('upstream/master')
+        repo.git.commit(allow_empty=True, m="Local change 1")
+        repo.git.checkout('upstream/master')
+        repo.git.commit(allow_empty=True, m="Upstream change")
+        upstream = repo.git.rev_parse("HEAD")
+        repo.git.checkout('-')
+        repo.git.merge('upstream/master', no_ff=True, m="Import upstream")
+        merge = repo.git.rev_parse("HEAD")
+        repo.git.commit(allow_empty=True, m="Local change 2")
+
+        return upstream, merge
+
+    def test_iter_commits(self):
+        """Test iterating commits matches the list returned"""
+
+        repo = r.Repo('.')
+        upstream, merge = self._import(repo)
+        searcher = s.UpstreamMergeBaseSearcher(repo=repo)
+
+        commits = [c.hexsha for c in searcher.iter_commits()]
+        self.assertEquals(upstream, searcher.commit.hexsha)
+        self.assertEquals([c.hexsha for c in searcher.list()], commits)
+        self.assertEquals(merge, commits[-1])
+
+    def test_find_commit_graph(self):
+        """Test the same merge base is found with or without commit-graph"""
+
+        repo = r.Repo('.')
+        upstream, merge = self._import(repo)
+        # another upstream branch reachable from the first
+        repo.git.branch('upstream/old', 'upstream/master~1')
+
+        repo.git.commit_graph("write", "--reachable")
+        searcher = s.UpstreamMergeBaseSearcher(repo=repo)
+
+        self.assertEquals(upstream, searcher.find())
+        self.assertEquals([upstream], searcher._git_merge_bases(
+            [upstream, repo.git.rev_parse('upstream/old')]))
+
+    def test_find_jobs(self):
+        """Test splitting merge-base between commands finds the same base"""
+
+        repo = r.Repo('.')
+        upstream, merge = self._import(repo)
+        revs = [upstream, repo.git.rev_parse('upstream/master~1'), merge]
+        searcher = s.UpstreamMergeBaseSearcher(repo=repo)
+        expected = searcher._git_merge_bases(revs)
+        searcher.jobs = 2
+
+        self.assertEquals([merge], expected)
+        self.assertEquals(expected, searcher._git_merge_bases(revs))
+
+    def test_iter_commits_reverse(self):
+        """Test commits are listed oldest first when reversed"""
+
+        repo = r.Repo('.')
+        upstream, merge = self._import(repo)
+        searcher = s.UpstreamMergeBaseSearcher(repo=repo)
+
+        commits = [c.hexsha for c in searcher.iter_commits(reverse=True)]
+        self.assertEquals([c.hexsha for c in reversed(searcher.list())],
+                          commits)
+        self.assertEquals(merge, commits[0])
+
+    def test_walk_excludes_previous_import(self):
+        """Test the branch before a recorded import is excluded from walks"""
+
+        repo = r.Repo('.')
+        branch = repo.git.rev_parse("HEAD", abbrev_ref=True)
+        repo.git.branch('upstream/master')
+        repo.git.commit(allow_empty=True, m="Local change 1")
+        previous = repo.git.rev_parse("HEAD")
+        repo.git.checkout('upstream/master')
+        repo.git.commit(allow_empty=True, m="Upstream change")
+        upstream = repo.git.rev_parse("HEAD")
+        repo.git.checkout(branch)
+        repo.git.merge('upstream/master', no_ff=True, m="Import upstream")
+        merge = repo.git.rev_parse("HEAD")
+        rd.ImportRecord(branch, repo=repo).write(upstream, 'upstream/master')
+        repo.git.commit(allow_empty=True, m="Local change 2")
+        local = repo.git.rev_parse("HEAD")
+
+        searcher = s.UpstreamMergeBaseSearcher(pattern='upstream/master',
+                                               repo=repo)
+        self.assertEquals([local, merge],
+                          [c.hexsha for c in searcher.list()])
+
+        revs, options = searcher._walk_args()
+        if utils.check_git_version(2, 38, 0):
+            self.assertEquals(["%s..%s" % (upstream, "HEAD"), "--not",
+                               previous], revs)
+            self.assertEquals({'ancestry_path': upstream}, options)
+
+
+class TestStatsCommitFilter(testtools.TestCase):
+    """Test case for StatsCommitFilter class"""
+
+    def test_counts(self):
+        """Test commits in and out of the wrapped filter are counted"""
+
+        Commit = collections.namedtuple('Commit', ['hexsha', 'parents'])
+        commits = [Commit('a', ('b',)), Commit('c', ('a', 'd')),
+                   Commit('e', ('c',))]
+
+        stats_filter = s.StatsCommitFilter(s.NoMergeCommitFilter())
+        self.assertEquals(['a', 'e'], [c.hexsha for c in
+                                       stats_filter.filter(commits)])
+        self.assertEquals(3, stats_filter.stats.commits_in)
+        self.assertEquals(2, stats_filter.stats.commits_out)
+        self.assertEquals(0, stats_filter.stats.git_commands)
+        self.assertEquals("NoMergeCommitFilter", stats_filter.stats.name)
+
+
+class TestParallelCommitFilter(testtools.TestCase):
+    """Test case for ParallelCommitFilter class"""
+
+    class EvenCommitFilter(s.PerCommitFilter):
+
+        parallel = True
+
+        def include(self, commit):
+            return commit % 2 == 0
+
+    def test_order(self):
+        """Test commits are returned in order when evaluated in parallel"""
+
+        parallel_filter = s.ParallelCommitFilter(
+            TestParallelCommitFilter.EvenCommitFilter(), 4)
+        self.assertEquals(range(0, 100, 2),
+                          list(parallel_filter.filter(xrange(100))))
+
+    def test_not_parallel(self):
+        """Test filters not marked as parallel are rejected"""
+
+        self.assertRaises(ValueError, s.ParallelCommitFilter,
+                          s.NoMergeCommitFilter(), 4)
+
+    def test_include_required(self):
+        """Test filters missing include() cannot be created"""
+
+        class MissingCommitFilter(s.PerCommitFilter):
+            parallel = True
+
+        self.assertRaises(TypeError, MissingCommitFilter)
@@ -16,6 +16,8 @@
 """Tests for then 'utils' module"""
 
 from git_upstream.lib import utils as u
+from git_upstream.tests import base
+from git import repo as r
 
 import testtools
 
@@ -105,3 +107,62 @@ class TestCheckGitVersion(testtools.TestCase):
         (_maj, _min) = TestCheckGitVersion.get_current_git_version()[:2]
         result = u.check_git_version(_maj, _min, 0)
         self.assertEquals(True, result)
+
+
+class TestRepoSession(base.BaseTestCase):
+    """Test case for RepoSession class"""
+
+    class Resource(object):
+
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def test_shared(self):
+        """Test GitMixin objects share a single repository session"""
+
+        first = u.GitMixin()
+        second = u.GitMixin()
+        explicit = u.GitMixin(repo=r.Repo('.'))
+
+        self.assertIs(first.repo, second.repo)
+        self.assertIs(first.session, second.session)
+        self.assertIs(first.session, explicit.session)
+
+    def test_resource(self):
+        """Test resources are created once and closed with the session"""
+
+        session = u.RepoSession.for_repo(r.Repo('.'))
+        resource = session.resource('test', TestRepoSession.Resource)
+
+        self.assertIs(resource,
+                      session.resource('test', TestRepoSession.Resource))
+        session.close()
+        self.assertTrue(resource.closed)
+        self.assertIsNot(resource,
+                         session.resource('test', TestRepoSession.Resource))
+
+
+class TestValidCommits(base.BaseTestCase):
+    """Test case for GitMixin.valid_commits method"""
+
+    def test_valid_commits(self):
+        """Test names are checked for reachable commits together"""
+
+        mixin = u.GitMixin()
+        git = mixin.git
+        head = git.rev_parse("HEAD")
+        # a commit not reachable from any reference
+        dangling = git.commit_tree("HEAD^{tree}", p="HEAD", m="Dangling")
+        git.branch("other", "HEAD~1")
+
+        self.assertEquals(
+            {head: True, "HEAD": True, dangling: False, "missing": False,
+             "HEAD^{tree}": False},
+            mixin.valid_commits([head, "HEAD", dangling, "missing",
+                                 "HEAD^{tree}"]))
+        self.assertEquals({head: False, "other": True},
+                          mixin.valid_commits([head, "other"],
+                                              refs=["other"]))
+        self.assertTrue(mixin.is_valid_commit(head))
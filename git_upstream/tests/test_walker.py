@@ -0,0 +1,107 @@
+# Copyright (c) 2012, 2013, 2014 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the walker module"""
+
+from git_upstream.lib import walker as w
+from git_upstream.tests import base
+from git import repo as r
+
+import testtools
+
+
+class TestGetChangeId(testtools.TestCase):
+    """Test case for get_change_id function"""
+
+    def test_footer(self):
+        """Test Change-Id is read from the footer"""
+
+        message = "Subject\n\nBody\n\nChange-Id: I0123abcd\n"
+        self.assertEquals("I0123abcd", w.get_change_id(message))
+
+    def test_not_in_footer(self):
+        """Test Change-Id outside of the footer is ignored"""
+
+        message = "Subject\n\nChange-Id: I0123abcd\n\nSigned-off-by: A\n"
+        self.assertEquals(None, w.get_change_id(message))
+
+
+class TestCommitWalker(base.BaseTestCase):
+    """Test case for CommitWalker class"""
+
+    note_ref = 'refs/notes/upstream-merge'
+    change_id = "I0000000000000000000000000000000000000001"
+
+    def test_walk(self):
+        """Test commit details are read from a single walk"""
+
+        repo = r.Repo('.')
+        parent = repo.git.rev_parse("HEAD")
+        repo.git.commit(allow_empty=True,
+                        m="Subject line\n\nBody\n\nChange-Id: %s" %
+                        TestCommitWalker.change_id)
+        head = repo.git.rev_parse("HEAD")
+        repo.git.notes('--ref', TestCommitWalker.note_ref, 'add', '-m',
+                       'Dropped: Walter White <heisenberg@hp.com>', head)
+
+        commits = list(w.CommitWalker(repo=repo).walk(
+            "%s~1..%s" % (parent, head)))
+
+        self.assertEquals(2, len(commits))
+        self.assertEquals(head, commits[0].hexsha)
+        self.assertEquals((parent,), commits[0].parents)
+        self.assertEquals("Subject line", commits[0].summary)
+        self.assertEquals(TestCommitWalker.change_id, commits[0].change_id)
+        self.assertTrue(commits[0].dropped)
+        self.assertEquals((), commits[0].superseded_by)
+        self.assertEquals(parent, commits[1].hexsha)
+        self.assertFalse(commits[1].dropped)
+        self.assertEquals(commits[1].binsha, commits[0].parent_binshas[0])
+
+    def test_walk_message_projection(self):
+        """Test Change-Id is parsed from the message without trailers"""
+
+        repo = r.Repo('.')
+        repo.git.commit(allow_empty=True,
+                        m="Subject line\n\nChange-Id: %s" %
+                        TestCommitWalker.change_id)
+
+        walker = w.CommitWalker(trailers=False, repo=repo)
+        commit = next(walker.walk("HEAD", max_count=1))
+
+        self.assertEquals(TestCommitWalker.change_id, commit.change_id)
+
+    def test_walk_footer_with_prose(self):
+        """Test Change-Id is found in a footer git does not see as trailers"""
+
+        repo = r.Repo('.')
+        repo.git.commit(allow_empty=True,
+                        m="Subject line\n\nSome explanation\nChange-Id: %s" %
+                        TestCommitWalker.change_id)
+
+        change_ids = [
+            next(w.CommitWalker(trailers=trailers, repo=repo).walk(
+                "HEAD", max_count=1)).change_id
+            for trailers in (True, False)]
+
+        self.assertEquals([TestCommitWalker.change_id] * 2, change_ids)
+
+    def test_change_id_trailer_with_spaces(self):
+        """Test whole trailer value is kept when it contains whitespace"""
+
+        walker = w.CommitWalker(trailers=True, repo=r.Repo('.'))
+
+        self.assertEquals("I1234 extra words",
+                          walker._change_id("I0000\nI1234 extra words\n"))